@@ -0,0 +1,549 @@
+import importlib.util
+import math
+import os
+import random
+import subprocess
+import sys
+import types
+
+import pytest
+
+
+# wordfind_1.0.py is not an importable module name, the fixture below loads it from here
+WORDFIND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordfind_1.0.py")
+
+# short words too, so that a random fill would spell extra ones
+ANIMALS = ["LION", "ZEBRA", "GIRAFFE", "HIPPO", "RHINO", "CHEETAH", "GORILLA", "BISON", "PANTHER", "SLOTH", "OX", "YAK", "GNU", "EMU", "ELK", "APE", "BAT", "COW"]
+
+SMALL_INPUT = """Rows: 10
+Cols: 12
+Font Size: M
+
+Title: "Savanna"
+Word List:
+Lion
+Zebra
+Giraffe
+Hippo
+
+Title: "Ocean"
+Word List:
+Shark
+Whale
+Octopus
+Seal
+
+Title: "Forest"
+Word List:
+Bear
+Wolf
+Deer
+Owl
+"""
+
+
+# fixture: the generator module, loaded once for all tests
+@pytest.fixture(scope="module")
+def wordfind():
+    spec = importlib.util.spec_from_file_location("wordfind", WORDFIND_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["wordfind"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# function: every occurrence of the words in a grid, found by reading every line both ways
+def brute_force_occurrences(wordfind, grid, words):
+    rows, cols = len(grid), len(grid[0])
+    occurrences = set()
+    for word in words:
+        for direction, (row_step, col_step) in wordfind.DIRECTION_STEPS.items():
+            for row in range(rows):
+                for col in range(cols):
+                    end_row = row + (len(word) - 1) * row_step
+                    end_col = col + (len(word) - 1) * col_step
+                    if not (0 <= end_row < rows and 0 <= end_col < cols):
+                        continue
+                    if all(grid[row + i * row_step][col + i * col_step] == letter for i, letter in enumerate(word)):
+                        occurrences.add(frozenset(((row, col), (end_row, end_col))) | {word})
+    return occurrences
+
+
+# function: (row, col) of every cell of an occurrence
+def occurrence_cells(wordfind, occurrence):
+    word, start_row, start_col, _, _, direction = occurrence
+    row_step, col_step = wordfind.DIRECTION_STEPS[direction]
+    return {(start_row + i * row_step, start_col + i * col_step) for i in range(len(word))}
+
+
+# function: generated puzzle of the animal words
+def generated(wordfind, seed, fill="unique"):
+    generator = wordfind.WordFindPuzzleGenerator(12, 12, list(ANIMALS), 'M', 'L', debug=False, seed=seed)
+    generator.set_font_size('M', 'L')
+    generator.generate_puzzle(list(ANIMALS), "backtracking", wordfind.DEFAULT_NODE_BUDGET, None, fill, 1.0)
+    return generator
+
+
+# function: write a small input file of three puzzles, returns its path
+def write_input(tmp_path, name="animals.txt", text=SMALL_INPUT):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_grid_state_undo_keeps_shared_cells(wordfind):
+    state = wordfind.GridState(5, 5)
+    state.place("CAT", 0, 0, "horizontal")
+    assert state.fits("COW", 0, 0, "vertical")
+    assert not state.fits("DOG", 0, 0, "vertical")
+    state.place("COW", 0, 0, "vertical")
+    assert state.refs[0] == 2
+    assert state.letter_positions("C") == [(0, 0)]
+
+    # undoing the crossing word keeps the letter it shares with the first one
+    state.undo()
+    assert state.to_rows()[0][:3] == ["C", "A", "T"]
+    assert state.letter(1, 0) == "" and state.letter(2, 0) == ""
+    assert state.refs[0] == 1
+    assert state.letter_positions("O") == [] and state.letter_positions("W") == []
+
+    state.undo()
+    assert all(code == 0 for code in state.cells)
+    assert all(count == 0 for count in state.refs)
+    assert all(not cells for cells in state.letter_cells.values())
+
+
+def test_grid_state_rejects_words_off_the_grid(wordfind):
+    state = wordfind.GridState(4, 6)
+    assert state.fits("HORSE", 3, 5, "horizontal_backward")
+    assert not state.fits("HORSE", 3, 5, "vertical")
+    assert not state.fits("HORSE", 0, 2, "horizontal")
+    assert list(state.cell_indexes(3, 1, 1, "diagonal_tl_br")) == [7, 14, 21]
+
+
+def test_possible_positions_matches_brute_force(wordfind):
+    generator = wordfind.WordFindPuzzleGenerator(7, 9, [], "M", "L", False, seed=3)
+    generator.place_word("TIGER", 1, 2, "horizontal")
+    generator.place_word("GOAT", 1, 4, "vertical")
+    generator.place_word("RAT", 6, 8, "diagonal_br_tl")
+    for word in ("TOAD", "GOAT", "AT", "ANTELOPE", "ELEPHANTINE"):
+        for direction in wordfind.DIRECTIONS:
+            expected = [(row, col) for row in range(generator.rows) for col in range(generator.cols)
+                        if generator.state.fits(word, row, col, direction)]
+            assert sorted(generator.possible_positions(word, direction)) == expected
+
+
+def test_constraint_solver_places_the_most_constrained_word_first(wordfind):
+    # on a 5x7 grid GIRAFFE only fits along a row, the shorter words have many more slots
+    words = ["CAT", "HORSE", "GIRAFFE"]
+    generator = wordfind.WordFindPuzzleGenerator(5, 7, words, "M", "L", False, seed=1)
+    generator.fill_grid()
+    assert generator.constraint_word_placement()
+    assert generator.placed_words[0] == "GIRAFFE"
+    assert generator.placement_info[0][5] in ("horizontal", "horizontal_backward")
+    assert sorted(generator.placed_words) == sorted(words)
+
+
+def test_constraint_solver_stops_at_the_node_budget(wordfind):
+    words = ["LION", "TIGER", "ZEBRA", "HORSE", "CAMEL", "OTTER"]
+    generator = wordfind.WordFindPuzzleGenerator(8, 8, words, "M", "L", False, seed=1)
+    generator.fill_grid()
+    assert not generator.constraint_word_placement(node_budget=3)
+    assert generator.nodes_visited == 3
+    assert len(generator.placed_words) == 3
+    assert len(generator.words_not_placed) == 3
+
+
+def test_generation_is_deterministic_for_a_seed(wordfind):
+    assert generated(wordfind, 9).grid == generated(wordfind, 9).grid
+
+
+def test_books_do_not_depend_on_the_job_count(wordfind, tmp_path):
+    input_path = write_input(tmp_path)
+    books = []
+    for jobs in (1, 2):
+        pdf_path = str(tmp_path / f"puzzles_{jobs}.pdf")
+        solution_pdf_path = str(tmp_path / f"solutions_{jobs}.pdf")
+        assert wordfind.build_books(input_path, pdf_path, solution_pdf_path, jobs=jobs, seed=7) == 3
+        with open(pdf_path, "rb") as pdf_file, open(solution_pdf_path, "rb") as solution_file:
+            books.append((pdf_file.read(), solution_file.read()))
+    assert books[0] == books[1]
+
+
+def test_iter_puzzle_specs_yields_each_puzzle_as_it_is_read(wordfind):
+    read = []
+
+    # function: lines of the input, noting how far they were read
+    def lines():
+        for line in SMALL_INPUT.splitlines(keepends=True):
+            read.append(line)
+            yield line
+
+    specs = wordfind.iter_puzzle_specs(lines())
+    first = next(specs)
+    assert first == wordfind.PuzzleSpec('"Savanna"', 10, 12, "M", wordfind.DEFAULT_TITLE_SIZE, ("Lion", "Zebra", "Giraffe", "Hippo"))
+    # the second title closed the first puzzle, nothing after it was read yet
+    assert read[-1].strip() == 'Title: "Ocean"'
+
+    rest = list(specs)
+    assert [spec.title for spec in rest] == ['"Ocean"', '"Forest"']
+    assert all((spec.rows, spec.cols) == (10, 12) for spec in rest)
+
+
+def test_find_occurrences_matches_brute_force(wordfind):
+    letter_random = random.Random(5)
+    words = ["CAB", "ABA", "BAD", "DAB", "A", "ACE"]
+    for _ in range(20):
+        grid = [[letter_random.choice("ABCDE") for _ in range(7)] for _ in range(6)]
+        found = wordfind.find_occurrences(grid, words)
+        assert len(found) == len(set(found))
+        assert {frozenset(((start_row, start_col), (end_row, end_col))) | {word} for word, start_row, start_col, end_row, end_col, _ in found} == brute_force_occurrences(wordfind, grid, words)
+
+
+def test_find_occurrences_reports_start_and_direction(wordfind):
+    grid = [list("XTACX"), list("XXXXX"), list("XXXXX")]
+    assert wordfind.find_occurrences(grid, ["cat"]) == [("CAT", 0, 3, 0, 1, "horizontal_backward")]
+    assert wordfind.ambiguous_words(grid, ["CAT", "DOG"]) == {"DOG": 0}
+
+
+def test_completes_word_matches_brute_force(wordfind):
+    words = ["CAT", "TACK", "ACT"]
+    fill_index = wordfind.build_fill_index(words)
+    for before in ["", "C", "XC", "TA", "K"]:
+        for after in ["", "T", "TX", "CK", "A"]:
+            for letter in "ACKTX":
+                line = before + letter + after
+                expected = any(
+                    line[start:start + len(pattern)] == pattern and start <= len(before) < start + len(pattern)
+                    for word in words for pattern in (word, word[::-1]) for start in range(len(line))
+                )
+                assert wordfind.completes_word(letter, [(before, after)], fill_index) == expected
+
+
+# crossing words can spell a listed word on their own, only the filled cells are checked
+@pytest.mark.parametrize("seed", range(20))
+def test_fill_grid_unique_adds_no_occurrences(wordfind, seed):
+    generator = generated(wordfind, seed)
+    assert generator.words_not_placed == []
+    assert generator.fill_conflicts == 0
+    assert all(letter for row in generator.grid for letter in row)
+
+    placed_cells = set()
+    for placement in generator.placement_info:
+        placed_cells |= occurrence_cells(wordfind, placement)
+    extra = set(wordfind.find_occurrences(generator.grid, ANIMALS)) - set(generator.placement_info)
+    assert all(occurrence_cells(wordfind, occurrence) <= placed_cells for occurrence in extra)
+
+
+def test_iter_puzzle_specs_auto_size(wordfind):
+    specs = list(wordfind.iter_puzzle_specs(["Cols: 9", "Title: A", "Word List:", "Cat", "Title: B", "Rows: auto", "Cols: auto", "Word List:", "Dog"], auto_size=True))
+    assert [(spec.rows, spec.cols) for spec in specs] == [(None, 9), (None, None)]
+
+
+def test_grid_size_problem(wordfind):
+    assert "longest word" in wordfind.grid_size_problem(4, 4, ["LION", "ZEBRA"])
+    assert "12 letters for 9 cells" in wordfind.grid_size_problem(3, 3, ["CAT", "DOG", "EMU", "OWL"])
+    assert wordfind.grid_size_problem(3, 7, ["SEA LION", "CAT"]) is None
+    assert wordfind.grid_size_problem(1, 1, []) is None
+
+
+def test_find_grid_size_finds_a_grid_one_size_up_from_a_failure(wordfind):
+    rows, cols = wordfind.find_grid_size(ANIMALS, seed=4)
+    assert cols == math.ceil(rows * wordfind.DEFAULT_ASPECT)
+    assert wordfind.quick_fit(rows, cols, ANIMALS, 4)
+    smaller = (rows - 1, math.ceil((rows - 1) * wordfind.DEFAULT_ASPECT))
+    assert not wordfind.quick_fit(*smaller, ANIMALS, 4)
+
+    # a fixed side stays as given, only the other one is searched
+    rows, cols = wordfind.find_grid_size(ANIMALS, cols=8, seed=4)
+    assert cols == 8 and wordfind.quick_fit(rows, cols, ANIMALS, 4)
+    rows, cols = wordfind.find_grid_size(ANIMALS, rows=9, seed=4)
+    assert rows == 9 and wordfind.quick_fit(rows, cols, ANIMALS, 4)
+    assert wordfind.find_grid_size(ANIMALS, 5, 6) == (5, 6)
+
+
+def test_luby_sequence(wordfind):
+    assert [wordfind.luby(i) for i in range(1, 16)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+
+
+def test_portfolio_winner_is_the_lowest_complete_attempt(wordfind):
+    # function: stand-in for a finished generator of one attempt
+    def attempt(number, placed, not_placed):
+        return types.SimpleNamespace(attempt=number, placed_words=["W"] * placed, words_not_placed=["W"] * not_placed)
+
+    complete = [attempt(3, 5, 0), attempt(0, 4, 1), attempt(2, 5, 0)]
+    assert wordfind.portfolio_winner(complete).attempt == 2
+    partial = [attempt(1, 3, 2), attempt(2, 4, 1), attempt(0, 4, 1)]
+    assert wordfind.portfolio_winner(partial).attempt == 0
+
+
+# crowded 9x9 puzzles of random words, so that the first attempt often fails
+def crowded_specs(wordfind):
+    for k in range(4):
+        word_random = random.Random(k)
+        words = tuple("".join(word_random.choice(wordfind.FILL_LETTERS) for _ in range(word_random.randint(4, 7))) for _ in range(13))
+        yield wordfind.PuzzleSpec(f"Crowded {k}", 9, 9, "M", "L", words)
+
+
+def test_portfolio_winner_does_not_depend_on_the_job_count(wordfind):
+    options = wordfind.GenerationOptions(node_budget=200, restart_unit=None, portfolio=4, fill="random")
+    sequential = [generator for _, generator in wordfind.iter_generated_puzzles(crowded_specs(wordfind), 1, 1, options)]
+    pooled = [generator for _, generator in wordfind.iter_generated_puzzles(crowded_specs(wordfind), 3, 1, options)]
+    assert any(generator.attempt > 0 for generator in sequential)
+    assert [(generator.attempt, generator.grid) for generator in sequential] == [(generator.attempt, generator.grid) for generator in pooled]
+
+
+def test_puzzle_cache_key_covers_what_decides_the_grid(wordfind):
+    cache = wordfind.PuzzleCache("unused")
+    spec = wordfind.PuzzleSpec("Savanna", 12, 12, "M", "L", ("Lion", "Zebra"))
+    options = wordfind.GenerationOptions()
+    key = cache.key(spec, 1, options)
+    # title, fonts and the spelling of the words do not change the grid
+    assert cache.key(spec._replace(title="Plains", font_size="S", words=(" lion", "ZEBRA ")), 1, options) == key
+    assert cache.key(spec, 2, options) != key
+    assert cache.key(spec._replace(cols=13), 1, options) != key
+    assert cache.key(spec._replace(words=("Lion", "Zebra", "Gnu")), 1, options) != key
+    assert cache.key(spec, 1, options._replace(node_budget=1000)) != key
+    assert cache.key(spec, 1, options._replace(solver="constraint")) != key
+
+
+def test_puzzle_cache_round_trip(wordfind, tmp_path):
+    options = wordfind.GenerationOptions(cache=wordfind.PuzzleCache(str(tmp_path)))
+    spec = wordfind.PuzzleSpec("Savanna", 12, 12, "M", "L", tuple(ANIMALS))
+    fresh = wordfind.cached_puzzle_job(spec, 5, options)
+    key = options.cache.key(spec, 5, options)
+    assert options.cache.load(key) == fresh.cache_entry()
+
+    cached = wordfind.cached_puzzle_job(spec, 5, options)
+    assert cached.nodes_visited == 0
+    assert cached.grid == fresh.grid
+    assert cached.placement_info == fresh.placement_info
+    assert cached.words_not_placed == fresh.words_not_placed
+    assert options.cache.load("0" * 64) is None
+
+
+def test_puzzle_cache_evicts_the_least_recently_used_entries(wordfind, tmp_path):
+    cache = wordfind.PuzzleCache(str(tmp_path))
+    generator = generated(wordfind, 1, "random")
+    keys = [format(index, "064x") for index in range(4)]
+    for age, key in enumerate(keys):
+        cache.store(key, generator)
+        os.utime(cache.path(key), (1000 - age, 1000 - age))
+
+    # the oldest entry was just read, so the next two oldest go
+    assert cache.load(keys[3]) is not None
+    cache.max_size = 2 * os.path.getsize(cache.path(keys[0]))
+    cache.evict()
+    assert [os.path.exists(cache.path(key)) for key in keys] == [True, False, False, True]
+
+
+# function: content stream and page size of every page of a PDF
+def pdf_pages(pypdf, path):
+    return [(page.get_contents().get_data(), tuple(page.mediabox)) for page in pypdf.PdfReader(path).pages]
+
+
+def test_rebuild_books_matches_a_full_build(wordfind, tmp_path, capsys):
+    pypdf = pytest.importorskip("pypdf")
+    input_path = write_input(tmp_path)
+    pdf_path = str(tmp_path / "puzzles.pdf")
+    solution_pdf_path = str(tmp_path / "solutions.pdf")
+    options = wordfind.GenerationOptions(debug=True)
+    wordfind.rebuild_books(input_path, pdf_path, solution_pdf_path, seed=7, options=options)
+
+    # edit the last puzzle: only its puzzle page and the solution page it shares are redrawn
+    write_input(tmp_path, text=SMALL_INPUT.replace("Owl", "Moose"))
+    capsys.readouterr()
+    assert wordfind.rebuild_books(input_path, pdf_path, solution_pdf_path, options=options) == 3
+    assert "Regenerating 1 of 3 puzzles, 1 puzzle and 1 solution pages" in capsys.readouterr().out
+
+    full_pdf_path = str(tmp_path / "full_puzzles.pdf")
+    full_solution_pdf_path = str(tmp_path / "full_solutions.pdf")
+    wordfind.build_books(input_path, full_pdf_path, full_solution_pdf_path, seed=7)
+    assert pdf_pages(pypdf, pdf_path) == pdf_pages(pypdf, full_pdf_path)
+    assert pdf_pages(pypdf, solution_pdf_path) == pdf_pages(pypdf, full_solution_pdf_path)
+
+
+def test_sharded_books_split_on_solution_pages(wordfind, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    with pytest.raises(ValueError):
+        wordfind.BookWriter("book.pdf", "solutions.pdf", shard_size=0, books=())
+    assert wordfind.BookWriter("book.pdf", "solutions.pdf", 4, shard_size=5, books=()).shard_size == 8
+
+    # a shard size of 1 is rounded up to the 2 solutions of a page
+    input_path = write_input(tmp_path)
+    pdf_path = str(tmp_path / "puzzles.pdf")
+    solution_pdf_path = str(tmp_path / "solutions.pdf")
+    wordfind.build_books(input_path, pdf_path, solution_pdf_path, seed=7, shard_size=1)
+    assert not os.path.exists(pdf_path) and not os.path.exists(solution_pdf_path)
+    assert sorted(os.listdir(tmp_path)) == ["animals.txt", "puzzles-0001.pdf", "puzzles-0002.pdf", "solutions-0001.pdf", "solutions-0002.pdf"]
+    assert [len(pypdf.PdfReader(wordfind.shard_path(pdf_path, index)).pages) for index in (1, 2)] == [2, 1]
+    assert [len(pypdf.PdfReader(wordfind.shard_path(solution_pdf_path, index)).pages) for index in (1, 2)] == [1, 1]
+
+
+def test_merged_shards_match_an_unsharded_build(wordfind, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    input_path = write_input(tmp_path)
+    pdf_path = str(tmp_path / "puzzles.pdf")
+    solution_pdf_path = str(tmp_path / "solutions.pdf")
+    wordfind.build_books(input_path, pdf_path, solution_pdf_path, seed=7, shard_size=2, merge_shards=True)
+    assert sorted(os.listdir(tmp_path)) == ["animals.txt", "puzzles.pdf", "solutions.pdf"]
+
+    whole_pdf_path = str(tmp_path / "whole_puzzles.pdf")
+    whole_solution_pdf_path = str(tmp_path / "whole_solutions.pdf")
+    wordfind.build_books(input_path, whole_pdf_path, whole_solution_pdf_path, seed=7)
+    assert pdf_pages(pypdf, pdf_path) == pdf_pages(pypdf, whole_pdf_path)
+    assert pdf_pages(pypdf, solution_pdf_path) == pdf_pages(pypdf, whole_solution_pdf_path)
+
+
+def test_parse_puzzle_request(wordfind):
+    spec, seed = wordfind.parse_puzzle_request(b'{"title": "Pets", "rows": 8, "cols": "auto", "words": [" Cat ", "Dog"], "seed": 3}')
+    assert spec == wordfind.PuzzleSpec("Pets", 8, None, wordfind.DEFAULT_FONT_SIZE, wordfind.DEFAULT_TITLE_SIZE, ("Cat", "Dog"))
+    assert seed == wordfind.derive_seed(3, spec)
+
+    spec, _ = wordfind.parse_puzzle_request(b'{"words": ["Cat"]}')
+    assert (spec.title, spec.rows, spec.cols) == ("Word Search", wordfind.DEFAULT_ROWS, wordfind.DEFAULT_COLS)
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b'["Cat"]',
+    b"{}",
+    b'{"words": []}',
+    b'{"words": ["Cat", " "]}',
+    b'{"words": ["Cat", 7]}',
+    b'{"words": ["Cat"], "title": 1}',
+    b'{"words": ["Cat"], "rows": 0}',
+    b'{"words": ["Cat"], "cols": 151}',
+    b'{"words": ["Cat"], "rows": 8.5}',
+    b'{"words": ["Cat"], "rows": true}',
+    b'{"words": ["Cat"], "cols": "wide"}',
+    b'{"words": ["Cat"], "seed": "3"}',
+    b'{"words": ["Cat"], "seed": false}',
+])
+def test_parse_puzzle_request_rejects_bad_requests(wordfind, body):
+    with pytest.raises(ValueError):
+        wordfind.parse_puzzle_request(body)
+
+
+def test_output_paths(wordfind):
+    out = os.path.join("out", "books")
+    assert wordfind.output_paths(os.path.join("inputs", "Animal Kingdom.txt"), out, ["pdf", "text"]) == (
+        os.path.join(out, "Animal Kingdom_puzzles.pdf"),
+        os.path.join(out, "Animal Kingdom_solution.pdf"),
+        None,
+        None,
+        os.path.join(out, "Animal Kingdom_puzzles.txt")
+    )
+    assert wordfind.output_paths("pets.txt", "", ["jsonl", "archive"]) == (None, None, "pets_puzzles.jsonl", "pets_puzzles.wfa", None)
+
+
+def test_parse_indexes(wordfind):
+    assert wordfind.parse_indexes("0,4,10-12") == [0, 4, 10, 11, 12]
+    assert wordfind.parse_indexes(" 3 - 4 , 1") == [3, 4, 1]
+    with pytest.raises(ValueError):
+        wordfind.parse_indexes("1,x")
+
+
+def test_expand_inputs(wordfind, tmp_path):
+    for name in ("b.txt", "a.txt", "c.wfa"):
+        (tmp_path / name).write_text("")
+    pattern = str(tmp_path / "*.txt")
+    assert wordfind.expand_inputs([pattern, str(tmp_path / "a.txt")]) == [str(tmp_path / "a.txt"), str(tmp_path / "b.txt")]
+    with pytest.raises(FileNotFoundError):
+        wordfind.expand_inputs([str(tmp_path / "*.pdf")])
+
+
+def test_pack_puzzle_round_trip(wordfind):
+    spec = wordfind.PuzzleSpec('"Savanna"', 12, 12, "M", "L", tuple(ANIMALS) + ("ZEBRA",))
+    puzzle = wordfind.puzzle_from_generator(spec, generated(wordfind, 3))
+    assert wordfind.unpack_puzzle(wordfind.pack_puzzle(puzzle)) == puzzle
+
+    # letters that do not fit a byte, and a puzzle without a seed
+    unicode_puzzle = wordfind.Puzzle("Ωmega", 2, 2, "S", "XL", None, ("ЖΩ", "ab"), ("ЖΩ", "b"), (wordfind.Placement("ЖΩ", 0, 0, 0, 1, "horizontal"),))
+    assert wordfind.unpack_puzzle(wordfind.pack_puzzle(unicode_puzzle)) == unicode_puzzle
+
+
+def test_puzzle_archive_round_trip(wordfind, tmp_path):
+    puzzles = []
+    for seed in range(3):
+        spec = wordfind.PuzzleSpec(f"Puzzle {seed}", 12, 12, "M", "L", tuple(ANIMALS))
+        puzzles.append(wordfind.puzzle_from_generator(spec, generated(wordfind, seed, "random")))
+
+    path = str(tmp_path / "puzzles.wfa")
+    writer = wordfind.PuzzleArchiveWriter(path)
+    for puzzle in puzzles:
+        writer.add(puzzle)
+    writer.close()
+
+    archive = wordfind.PuzzleArchive(path)
+    try:
+        assert len(archive) == 3
+        assert list(archive) == puzzles
+        assert archive[-1] == puzzles[2]
+        with pytest.raises(IndexError):
+            archive[3]
+    finally:
+        archive.close()
+
+    # a grid restored from the archive is drawn from the same placements
+    generator = wordfind.generator_from_puzzle(puzzles[1])
+    assert wordfind.puzzle_from_generator(wordfind.puzzle_spec(puzzles[1]), generator) == puzzles[1]
+
+
+def test_puzzle_archive_rejects_other_files(wordfind, tmp_path):
+    path = tmp_path / "puzzles.wfa"
+    path.write_bytes(b"not an archive, just some text")
+    with pytest.raises(ValueError):
+        wordfind.PuzzleArchive(str(path))
+
+
+def test_output_stem_of_an_archive_is_its_input_stem(wordfind):
+    assert wordfind.output_stem(os.path.join("books", "pets_puzzles.wfa")) == "pets"
+    assert wordfind.output_stem("pets.wfa") == "pets"
+    assert wordfind.output_stem("pets_puzzles.txt") == "pets_puzzles"
+    assert wordfind.output_paths("pets_puzzles.wfa", "out", ["pdf"])[0] == os.path.join("out", "pets_puzzles.pdf")
+
+
+def test_render_archive_draws_the_same_books(wordfind, tmp_path):
+    input_path = write_input(tmp_path)
+    paths = wordfind.output_paths(input_path, str(tmp_path), ["pdf", "archive"])
+    wordfind.build_books(input_path, paths[0], paths[1], seed=7, archive_path=paths[3])
+    books = []
+    for path in paths[:2]:
+        with open(path, "rb") as pdf_file:
+            books.append(pdf_file.read())
+        os.remove(path)
+
+    assert wordfind.render_archive(paths[3], paths[0], paths[1]) == 3
+    for path, book in zip(paths[:2], books):
+        with open(path, "rb") as pdf_file:
+            assert pdf_file.read() == book
+
+
+# function: modules loaded by a fresh interpreter after running code with the module loaded as wordfind
+def loaded_modules(code, *arguments):
+    script = (
+        "import importlib.util, sys\n"
+        f"spec = importlib.util.spec_from_file_location('wordfind', {WORDFIND_PATH!r})\n"
+        "wordfind = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(wordfind)\n"
+        f"{code}\n"
+        "print(' '.join(sorted(sys.modules)))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script, *arguments], check=True, capture_output=True, text=True).stdout
+    return set(output.split())
+
+
+def test_import_loads_no_heavy_modules():
+    modules = loaded_modules("")
+    assert not {"reportlab", "numpy", "pypdf", "multiprocessing", "asyncio"} & modules
+
+
+def test_text_only_build_does_not_load_reportlab(tmp_path):
+    input_path = write_input(tmp_path)
+    text_path = str(tmp_path / "animals_puzzles.txt")
+    modules = loaded_modules("wordfind.build_books(sys.argv[1], None, None, seed=7, text_path=sys.argv[2])", input_path, text_path)
+    assert "reportlab" not in modules
+    with open(text_path) as text_file:
+        text = text_file.read()
+    assert [line for line in text.splitlines() if line in ("Savanna", "Ocean", "Forest")] == ["Savanna", "Ocean", "Forest"]
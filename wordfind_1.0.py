@@ -1,21 +1,530 @@
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import io
+import os
 import random
 import math
-from prettytable import PrettyTable
-from reportlab.lib import colors
-from reportlab.lib import pagesizes
-from reportlab.lib.pagesizes import portrait, letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import struct
+import sys
+import time
+from array import array
+from collections import deque, namedtuple
+from functools import lru_cache
+
+# reportlab and prettytable are only imported by the functions that draw PDFs, numpy by the
+# anchor scan of the solvers, asyncio by the service and the process pools where workers are
+# started, so a run loads only what it uses and the jsonl/archive/text outputs never load the
+# render libraries
+
+
+# (row step, col step) between consecutive letters of a word for each direction
+DIRECTION_STEPS = {
+    "horizontal": (0, 1),
+    "horizontal_backward": (0, -1),
+    "vertical": (1, 0),
+    "vertical_upward": (-1, 0),
+    "diagonal_tl_br": (1, 1),
+    "diagonal_tr_bl": (1, -1),
+    "diagonal_bl_tr": (-1, 1),
+    "diagonal_br_tl": (-1, -1)
+}
+DIRECTIONS = list(DIRECTION_STEPS)
+
+
+# function: range of anchor rows (or cols) that keep a word of this length inside the grid
+def anchor_range(size, step, word_length):
+    if step > 0:
+        return 0, size - word_length + 1
+    if step < 0:
+        return word_length - 1, size
+    return 0, size
+
+
+# grids with more cells than this place words from random samples before scanning (see sampled_placements)
+SAMPLED_PLACEMENT_CELLS = 100 * 100
+PLACEMENT_SAMPLES = 64 # random crossings, then random anchors, checked per word on such grids
+
+
+# class: registers each font once per process and memoizes glyph widths
+    # widths are kept per (glyph, font, size), so a whole book only measures
+    # the few dozen glyphs it actually uses
+class FontManager:
+    def __init__(self):
+        self.registered = set()
+        self.glyph_widths = {}
+
+    # function: register a TrueType font the first time it is asked for, returns the font name
+    def register(self, font_name, font_file):
+        if font_name not in self.registered:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+            pdfmetrics.registerFont(TTFont(font_name, font_file))
+            self.registered.add(font_name)
+        return font_name
+
+    # function: width of a string in points, summed from the cached glyph widths
+    def string_width(self, text, font_name, font_size):
+        glyph_widths = self.glyph_widths
+        width = 0
+        for glyph in text:
+            key = (glyph, font_name, font_size)
+            glyph_width = glyph_widths.get(key)
+            if glyph_width is None:
+                from reportlab.pdfbase import pdfmetrics
+                glyph_width = glyph_widths[key] = pdfmetrics.stringWidth(glyph, font_name, font_size)
+            width += glyph_width
+        return width
+
+
+# process-wide font manager shared by every rendered page
+FONTS = FontManager()
+
+
+# solution highlight palette, one filled path is drawn per color
+HIGHLIGHT_COLORS = [
+    (0.99, 0.73, 0.73), (0.99, 0.86, 0.62), (0.98, 0.96, 0.62), (0.75, 0.93, 0.66),
+    (0.65, 0.91, 0.89), (0.67, 0.80, 0.98), (0.82, 0.74, 0.98), (0.97, 0.74, 0.91)
+]
+
+# letter page size in points (reportlab.lib.pagesizes.letter), page layouts need no reportlab import
+LETTER = (612.0, 792.0)
+
+# solution grids per page -> (slot columns, slot rows)
+NUP_ARRANGEMENTS = {1: (1, 1), 2: (1, 2), 4: (2, 2), 6: (2, 3)}
+
+
+# class: every coordinate of one puzzle on a page
+    # slot "puzzle" is the full puzzle page (title, grid and word list), slot "poster" the same
+    # on a page sized to a grid too large for the page (see poster_pagesize), slot (per_page, index)
+    # is one of the N-up grids of a solution page. N-up grids are scaled down to fit their slot,
+    # so cell and font sizes are read from the layout. Layouts only depend on the grid geometry,
+    # font sizes and page size, so get_page_layout shares them between puzzles.
+class PageLayout:
+    def __init__(self, rows, cols, font_size, title_font_size, cell_width, cell_height, pagesize, slot):
+        self.rows = rows
+        self.cols = cols
+        self.font_size = font_size
+        self.title_font_size = title_font_size
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.page_width, self.page_height = pagesize
+        self.slot = slot
+
+        # set the margins (1 inch = 72 points)
+        top_margin = 72
+        bottom_margin = 72
+        left_margin = 72
+        right_margin = 72
+
+        # calculate the effective page size with margins
+        self.content_width = self.page_width - left_margin - right_margin
+        self.content_height = self.page_height - top_margin - bottom_margin
+
+        if slot == "puzzle":
+            # Calculate the grid width and height
+            self.grid_width = cols * cell_width
+            self.grid_height = rows * cell_height
+
+            # calculate the offsets for centering the grid
+            horizontal_offset = (self.content_width - self.grid_width) / 2
+            vertical_offset = (self.content_height - self.grid_height) / 2
+
+            # title baseline and grid origin (bottom left corner of the grid)
+            self.title_left = 0
+            self.title_span = self.page_width
+            self.title_y = 750
+            self.grid_x = left_margin + horizontal_offset
+            self.grid_y = self.title_y - top_margin * 2 - vertical_offset - title_font_size
+
+            # word list origin below the grid
+            self.word_list_x = left_margin + horizontal_offset / 2
+            self.word_list_y = self.grid_y - vertical_offset + bottom_margin * 1.75
+        elif slot == "poster":
+            self.grid_width = cols * cell_width
+            self.grid_height = rows * cell_height
+
+            # title on top of the page, grid centered below it and the word list below the grid
+            self.title_left = 0
+            self.title_span = self.page_width
+            self.title_y = self.page_height - top_margin - title_font_size
+            self.grid_x = (self.page_width - self.grid_width) / 2
+            self.grid_y = self.title_y - title_font_size - cell_height - self.grid_height
+            self.word_list_x = left_margin
+            self.word_list_y = self.grid_y - cell_height * 2 - font_size
+        else:
+            per_page, index = slot
+            if per_page not in NUP_ARRANGEMENTS or not 0 <= index < per_page:
+                raise ValueError(f"Invalid layout slot: {slot}")
+            slot_columns, slot_rows = NUP_ARRANGEMENTS[per_page]
+
+            # slots split the page inside half inch margins, with a padding around each grid
+            page_margin = 36
+            padding = 9
+            slot_width = (self.page_width - 2 * page_margin) / slot_columns
+            slot_height = (self.page_height - 2 * page_margin) / slot_rows
+            slot_left = page_margin + (index % slot_columns) * slot_width
+            slot_top = self.page_height - page_margin - (index // slot_columns) * slot_height
+
+            # scale the grid (border included) and the title down until they fit the slot,
+            # rounded down to a 5% step so the page coordinates stay short
+            scale = min(
+                1,
+                (slot_width - 2 * padding) / ((cols + 1) * cell_width),
+                (slot_height - 2 * padding) / ((rows + 1) * cell_height + 2 * title_font_size)
+            )
+            scale = max(math.floor(scale * 20), 1) / 20
+            self.font_size = font_size * scale
+            self.title_font_size = title_font_size * scale
+            self.cell_width = cell_width = cell_width * scale
+            self.cell_height = cell_height = cell_height * scale
+
+            self.grid_width = cols * cell_width
+            self.grid_height = rows * cell_height
+
+            # title on top of the slot, grid centered below it
+            self.title_left = slot_left
+            self.title_span = slot_width
+            self.title_y = slot_top - padding - self.title_font_size
+            self.grid_x = slot_left + (slot_width - self.grid_width) / 2
+            self.grid_y = self.title_y - self.title_font_size - cell_height / 1.75 - self.grid_height
+
+            # solution slots have no word list
+            self.word_list_x = left_margin
+            self.word_list_y = self.grid_y + bottom_margin * 1.75
+
+        # cell_centers[row][col] is the (x, y) center of a grid cell
+        self.cell_centers = [
+            [
+                (self.grid_x + col * cell_width + cell_width / 2,
+                 self.grid_y + (rows - row - 1) * cell_height + cell_height / 2)
+                for col in range(cols)
+            ]
+            for row in range(rows)
+        ]
+
+        # border rectangle (x, y, width, height) around the grid
+        self.border = (
+            self.grid_x - cell_width / 1.75,
+            self.grid_y - cell_height / 1.75,
+            self.grid_width + cell_width,
+            self.grid_height + cell_height
+        )
+
+        # solution highlights: capsule radius and the offset from a cell center to the
+        # visual middle of its letter (drawn with the baseline at center - font_size / 2)
+        self.highlight_radius = min(cell_width, cell_height) * 0.45
+        self.letter_center_dy = -0.14 * self.font_size
+        self._word_list_columns = {}
+
+    # function: x coordinate that centers a title of this width on the page (or N-up slot)
+    def title_x(self, title_width):
+        return self.title_left + (self.title_span - title_width) / 2
+
+    # function: True when the bordered grid stays on the page and below the title baseline
+    def grid_fits_page(self):
+        x, y, width, height = self.border
+        return x >= 0 and y >= 0 and x + width <= self.page_width and y + height <= self.title_y
+
+    # function: x coordinate of every word list column for a word list shape
+        # poster columns split the content width evenly, as there can be many of them
+    def word_list_column_xs(self, num_columns, max_word_width):
+        key = (num_columns, max_word_width)
+        if key not in self._word_list_columns:
+            if self.slot == "poster":
+                column_width = self.content_width / num_columns
+            else:
+                column_spacing = (((self.content_width - (max_word_width * num_columns)) / num_columns - 1)) + 18
+                column_width = max_word_width + column_spacing
+            self._word_list_columns[key] = [
+                self.word_list_x + (col_idx * column_width) - (self.cell_width / 1.75)
+                for col_idx in range(num_columns)
+            ]
+        return self._word_list_columns[key]
+
+    # function: baseline of a word list row
+    def word_list_row_y(self, row_idx):
+        return self.word_list_y - row_idx * (self.font_size + self.font_size)
+
+
+# function: shared page layout for a grid geometry, font sizes, page size and slot
+@lru_cache(maxsize=256)
+def get_page_layout(rows, cols, font_size, title_font_size, cell_width, cell_height, pagesize, slot):
+    return PageLayout(rows, cols, font_size, title_font_size, cell_width, cell_height, pagesize, slot)
+
+
+# class: grid letters in one flat buffer with a reference count per cell and an undo journal
+    # cells holds unicode code points (0 = empty), refs counts the placed words covering each
+    # cell and the journal keeps the cell indexes of every placed word so place and undo are
+    # O(len(word)). A cell is only emptied once the last word covering it is undone.
+    # letter_cells maps each code point to the flat indexes of the cells holding it, so the
+    # cells a new word could cross are found without scanning the grid (filler letters
+    # written by set_letter are not indexed).
+class GridState:
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.clear()
+
+    # function: empty every cell and forget all placed words
+    def clear(self):
+        size = self.rows * self.cols
+        self.cells = array('I', [0]) * size
+        self.refs = array('H', [0]) * size
+        self.journal = []
+        self.letter_cells = {}
+
+    # function: flat indexes of the cells a word of this length covers from (row, col)
+    def cell_indexes(self, word_length, row, col, direction):
+        row_step, col_step = DIRECTION_STEPS[direction]
+        start = row * self.cols + col
+        stride = row_step * self.cols + col_step
+        return range(start, start + stride * word_length, stride)
+
+    # function: check that a word stays inside the grid and only crosses matching letters
+    def fits(self, word, row, col, direction):
+        row_step, col_step = DIRECTION_STEPS[direction]
+        end_row = row + (len(word) - 1) * row_step
+        end_col = col + (len(word) - 1) * col_step
+        if not (0 <= row < self.rows and 0 <= col < self.cols and 0 <= end_row < self.rows and 0 <= end_col < self.cols):
+            return False
+        cells = self.cells
+        for index, letter in zip(self.cell_indexes(len(word), row, col, direction), word):
+            if cells[index] != 0 and cells[index] != ord(letter):
+                return False
+        return True
+
+    # function: write a word into the grid and record it in the journal
+    def place(self, word, row, col, direction):
+        indexes = self.cell_indexes(len(word), row, col, direction)
+        for index, letter in zip(indexes, word):
+            if self.refs[index] == 0:
+                self.cells[index] = ord(letter)
+                self.letter_cells.setdefault(self.cells[index], set()).add(index)
+            self.refs[index] += 1
+        self.journal.append(indexes)
+
+    # function: take the most recently placed word back out of the grid
+    def undo(self):
+        for index in self.journal.pop():
+            self.refs[index] -= 1
+            if self.refs[index] == 0:
+                self.letter_cells[self.cells[index]].discard(index)
+                self.cells[index] = 0
+
+    # function: (row, col) of every cell holding a placed letter, in grid order
+    def letter_positions(self, letter):
+        return [divmod(index, self.cols) for index in sorted(self.letter_cells.get(ord(letter), ()))]
+
+    # function: True when a word from (row, col) covers at least one placed letter
+    def crosses(self, word_length, row, col, direction):
+        return any(self.cells[index] for index in self.cell_indexes(word_length, row, col, direction))
+
+    # function: letter in a cell ('' when empty)
+    def letter(self, row, col):
+        code = self.cells[row * self.cols + col]
+        return chr(code) if code else ''
+
+    # function: write a filler letter into an empty cell (not journaled)
+    def set_letter(self, row, col, letter):
+        self.cells[row * self.cols + col] = ord(letter)
+
+    # function: zero-copy numpy view of the cells with shape (rows, cols)
+    def as_array(self):
+        import numpy as np
+        return np.frombuffer(self.cells, dtype=np.uintc).reshape(self.rows, self.cols)
+
+    # function: the grid as rows of one-character strings ('' for empty cells)
+    def to_rows(self):
+        letters = [chr(code) if code else '' for code in self.cells]
+        return [letters[row * self.cols:(row + 1) * self.cols] for row in range(self.rows)]
+
+
+# line axes of the grid: (row step, col step) -> (direction reading along the axis, direction reading against it)
+LINE_AXES = {
+    (0, 1): ("horizontal", "horizontal_backward"),
+    (1, 0): ("vertical", "vertical_upward"),
+    (1, 1): ("diagonal_tl_br", "diagonal_br_tl"),
+    (1, -1): ("diagonal_tr_bl", "diagonal_bl_tr")
+}
+
+
+# function: cheap reason why a word list cannot fit a rows x cols grid (None when it might)
+    # The longest line of a grid is its longer side (a diagonal is only as long as the shorter
+    # one), so a word longer than both sides never fits, and without crossings the letters
+    # need one cell each.
+def grid_size_problem(rows, cols, words):
+    words = [word.replace(" ", "") for word in words]
+    longest_word = max((len(word) for word in words), default=0)
+    if longest_word > max(rows, cols):
+        return f"longest word has {longest_word} letters, longest line {max(rows, cols)} cells"
+    total_word_length = sum(len(word) for word in words)
+    if total_word_length > rows * cols:
+        return f"{total_word_length} letters for {rows * cols} cells"
+    return None
+
+
+# letters used to fill the cells no word covers
+FILL_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+# function: prefix/suffix index of a word list for fill_grid_unique
+    # letter -> {prefix: {suffix}} for every position of that letter in every word and reversed
+    # word: a filled letter spells the word when the cells before it end with prefix and the
+    # cells after it start with suffix
+def build_fill_index(words):
+    fill_index = {}
+    for word in words:
+        for pattern in (word, word[::-1]):
+            for position, letter in enumerate(pattern):
+                fill_index.setdefault(letter, {}).setdefault(pattern[:position], set()).add(pattern[position + 1:])
+    return fill_index
+
+
+# function: True when a letter placed between the (before, after) contexts of a cell spells a word
+    # Only the endings of before and the beginnings of after are looked up, so the cost depends
+    # on the context length and not on how many words are listed.
+def completes_word(letter, contexts, fill_index):
+    prefixes = fill_index.get(letter, {})
+    for before, after in contexts:
+        for start in range(len(before) + 1):
+            suffixes = prefixes.get(before[start:])
+            if suffixes is not None and any(after[:end] in suffixes for end in range(len(after) + 1)):
+                return True
+    return False
+
+
+# class: Aho-Corasick automaton over a word list and the same words reversed
+    # One pass over a line finds every listed word reading along or against it.
+    # outputs[state] holds (length, word index, reversed) for each pattern ending in that state.
+class WordAutomaton:
+    def __init__(self, words):
+        self.words = [word.replace(" ", "").upper() for word in words]
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+        for word_index, word in enumerate(self.words):
+            if not word:
+                continue
+            self._add_pattern(word, (len(word), word_index, False))
+            self._add_pattern(word[::-1], (len(word), word_index, True))
+
+        # breadth first: the failure link of a state is the longest proper suffix that is also a prefix
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for letter, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and letter not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.transitions[fallback].get(letter, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    # WordAutomaton helper function: add one pattern to the trie
+    def _add_pattern(self, pattern, output):
+        state = 0
+        for letter in pattern:
+            next_state = self.transitions[state].get(letter)
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][letter] = next_state
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append(output)
+
+    # function: every (end position, length, word index, reversed) match in a text
+    def search(self, text):
+        transitions, fail, outputs = self.transitions, self.fail, self.outputs
+        state = 0
+        for position, letter in enumerate(text):
+            while state and letter not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(letter, 0)
+            for length, word_index, reversed_match in outputs[state]:
+                yield position, length, word_index, reversed_match
+
+
+# function: every line of cells of the grid along an axis, as lists of (row, col)
+def grid_lines(rows, cols, row_step, col_step):
+    starts = []
+    for row in range(rows):
+        for col in range(cols):
+            # a line starts where the previous cell along the axis would leave the grid
+            if not (0 <= row - row_step < rows and 0 <= col - col_step < cols):
+                starts.append((row, col))
+
+    lines = []
+    for row, col in starts:
+        line = []
+        while 0 <= row < rows and 0 <= col < cols:
+            line.append((row, col))
+            row += row_step
+            col += col_step
+        lines.append(line)
+    return lines
+
+
+# function: every occurrence of the listed words in a finished grid
+    # grid is a list of rows of letters. Occurrences use the placement_info tuple shape
+    # (word, start_row, start_col, end_row, end_col, direction) with the start on the first letter.
+    # A word found twice on the same cells (palindromes, one letter words) counts once.
+def find_occurrences(grid, words, automaton=None):
+    automaton = automaton or WordAutomaton(words)
+    rows = len(grid)
+    cols = len(grid[0]) if rows else 0
+
+    occurrences = []
+    seen = set()
+    for (row_step, col_step), (forward, backward) in LINE_AXES.items():
+        for line in grid_lines(rows, cols, row_step, col_step):
+            text = "".join(grid[row][col] or " " for row, col in line)
+            for position, length, word_index, reversed_match in automaton.search(text):
+                first, last = line[position - length + 1], line[position]
+                if reversed_match:
+                    first, last = last, first
+                key = (word_index, frozenset((first, last)))
+                if key in seen:
+                    continue
+                seen.add(key)
+                direction = backward if reversed_match else forward
+                occurrences.append((automaton.words[word_index], first[0], first[1], last[0], last[1], direction))
+    return occurrences
+
+
+# function: listed words that do not appear exactly once in a finished grid, with their counts
+def ambiguous_words(grid, words, automaton=None):
+    counts = {word.replace(" ", "").upper(): 0 for word in words if word.strip()}
+    for occurrence in find_occurrences(grid, words, automaton):
+        counts[occurrence[0]] += 1
+    return {word: count for word, count in counts.items() if count != 1}
+
+
+# function: i-th term (from 1) of the Luby restart sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ...
+def luby(i):
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    if i == (1 << k) - 1:
+        return 1 << (k - 1)
+    return luby(i - (1 << (k - 1)) + 1)
 
 
 class WordFindPuzzleGenerator:
-    def __init__(self, rows, cols, current_word_list, current_font_size, current_title_size, debug):
+    def __init__(self, rows, cols, current_word_list, current_font_size, current_title_size, debug, seed=None):
         self.rows = rows
         self.cols = cols
         self.debug = debug
 
+        # all random choices of this puzzle come from its own seed
+        self.seed = seed
+        self.random = random.Random(seed)
+
         # initialize lists
         self.placed_words = []
         self.placement_info = []
@@ -23,7 +532,7 @@ class WordFindPuzzleGenerator:
         self.words_not_placed = []
 
         # Initializes the empty grid
-        self.grid = [['' for _ in range(cols)] for _ in range(rows)]
+        self.state = GridState(rows, cols)
 
         # Defin the table cell size
         self.cell_width = 20
@@ -33,12 +542,36 @@ class WordFindPuzzleGenerator:
         self.font_size = -1
         self.title_font_size = -1
 
+        # instrumentation: counters are plain integers, timings (seconds per phase) are only
+        # taken when instrumented is set, see RunStats
+        self.instrumented = False
+        self.timings = {}
+        self.nodes_visited = 0
+        self.timed_out = False
+        self.backtracks = 0
+        self.restarts = 0
+        self.can_place_calls = 0
+        self.position_scans = 0
+        self.fill_conflicts = 0
+
+        # portfolio attempt this generator runs (0 outside portfolio mode) and an optional
+        # callable polled with the attempt during the search, True once the attempt can stop
+        self.attempt = 0
+        self.cancel_check = None
+
+        # True when the puzzle was loaded from a PuzzleCache instead of generated
+        self.cached = False
+
+        # listed words not found exactly once, set by verify_occurrences
+        self.ambiguous_words = None
+
+    # the grid as rows of one-character strings ('' for empty cells), built from the grid state
+    @property
+    def grid(self):
+        return self.state.to_rows()
+
     # function to set font size
     def set_font_size(self, font_size, title_size):
-        print("Entering set_font_size method")
-        print(f'Font Size: {self.font_size}')
-        print(f'Title Font Size: {self.title_font_size}')
-        
         sizes = {
             'XS': 10,
             'S': 12,
@@ -71,258 +604,419 @@ class WordFindPuzzleGenerator:
 
     # function: fill grid with empty strings
     def fill_grid(self):
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.grid[i][j] = ''
+        self.state.clear()
 
     # function: replace empty strings with random letters
     def fill_grid_random(self):
         for i in range(self.rows):
             for j in range(self.cols):
-                if self.grid[i][j] == '':
-                    self.grid[i][j] = random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                if self.state.letter(i, j) == '':
+                    self.state.set_letter(i, j, self.random.choice(FILL_LETTERS))
+
+    # function: replace empty strings with random letters that do not spell an extra listed word
+        # A new occurrence of a word has to pass through the cell being filled, so each cell is
+        # only checked against the word prefixes/suffixes around it on its four line axes.
+        # A letter that would complete a word is re-sampled; if every letter would, the first
+        # draw is kept and counted in fill_conflicts.
+    def fill_grid_unique(self):
+        words = [word.replace(" ", "").upper() for word in self.placed_words + self.words_not_placed]
+        fill_index = build_fill_index(words)
+        context_length = max((len(word) for word in words), default=1) - 1
+        self.fill_conflicts = 0
+
+        for i in range(self.rows):
+            for j in range(self.cols):
+                if self.state.letter(i, j) != '':
+                    continue
+                contexts = [self._line_context(i, j, row_step, col_step, context_length) for row_step, col_step in LINE_AXES]
+                letter = self.random.choice(FILL_LETTERS)
+                if completes_word(letter, contexts, fill_index):
+                    for alternative in self.random.sample(FILL_LETTERS, len(FILL_LETTERS)):
+                        if not completes_word(alternative, contexts, fill_index):
+                            letter = alternative
+                            break
+                    else:
+                        self.fill_conflicts += 1
+                self.state.set_letter(i, j, letter)
+
+    # fill_grid_unique helper function: letters before and after a cell along an axis
+        # runs stop at the first empty cell, the grid edge or after `length` letters
+    def _line_context(self, row, col, row_step, col_step, length):
+        before = []
+        r, c = row - row_step, col - col_step
+        while len(before) < length and 0 <= r < self.rows and 0 <= c < self.cols and self.state.letter(r, c):
+            before.append(self.state.letter(r, c))
+            r, c = r - row_step, c - col_step
+
+        after = []
+        r, c = row + row_step, col + col_step
+        while len(after) < length and 0 <= r < self.rows and 0 <= c < self.cols and self.state.letter(r, c):
+            after.append(self.state.letter(r, c))
+            r, c = r + row_step, c + col_step
+
+        return "".join(reversed(before)), "".join(after)
 
     # function: validate grid is able to accomodate all words
     def grid_all_word_validation(self):
-        total_word_length = sum(len(word) for word in self.remaining_words)
-        if total_word_length > self.rows * self.cols:
-            raise ValueError("Error: Grid size is too small to accommodate all words.")
+        problem = grid_size_problem(self.rows, self.cols, self.remaining_words)
+        if problem:
+            raise ValueError(f"Error: Grid size is too small to accommodate all words ({problem}).")
 
     # function: validate if word can be placed
     def can_place_word(self, word, row, col, direction):
-        if direction == "horizontal":
-            return self._can_place_horizontal(word, row, col)
-        elif direction == "horizontal_backward":
-            return self._can_place_horizontal_backward(word, row, col)
-        elif direction == "vertical":
-            return self._can_place_vertical(word, row, col)
-        elif direction == "vertical_upward":
-            return self._can_place_vertical_upward(word, row, col)
-        elif direction == "diagonal_tl_br":
-            return self._can_place_diagonal_tl_br(word, row, col)
-        elif direction == "diagonal_tr_bl":
-            return self._can_place_diagonal_tr_bl(word, row, col)
-        elif direction == "diagonal_bl_tr":
-            return self._can_place_diagonal_bl_tr(word, row, col)
-        elif direction == "diagonal_br_tl":
-            return self._can_place_diagonal_br_tl(word, row, col)
-        else:
-                raise ValueError("Invalid direction")
-
-    # can_place_word helper function: to validate horizontal word placement
-    def _can_place_horizontal(self, word, row, col):
-        max_col = self.cols - len(word)
-        return col + len(word) <= self.cols and all(self.grid[row][col + i] == '' or self.grid[row][col + i] == word[i] for i in range(len(word)))
-
-    # can_place_word helper function: to validate horizontal_backward word placement
-    def _can_place_horizontal_backward(self, word, row, col):
-        max_col = self.cols - len(word)
-        return col >= len(word) - 1 and all(self.grid[row][col - i] == '' or self.grid[row][col - i] == word[i] for i in range(len(word)))
-
-    # can_place_word helper function: to validate vertical word placement
-    def _can_place_vertical(self, word, row, col):
-        max_row = self.rows - len(word)
-        return row + len(word) <= self.rows and all(self.grid[row + i][col] == '' or self.grid[row + i][col] == word[i] for i in range(len(word)))
-
-    # can_place_word helper function: to validate vertical upward word placement
-    def _can_place_vertical_upward(self, word, row, col):
-        max_row = self.rows - len(word)
-        return row >= len(word) - 1 and all(self.grid[row - i][col] == '' or self.grid[row - i][col] == word[i] for i in range(len(word)))
-
-    # can_place_word helper function: to validate diagonal TL -> BR word placement
-    def _can_place_diagonal_tl_br(self, word, row, col):
-        return (
-            row + len(word) <= self.rows and col + len(word) <= self.cols and
-            all(self.grid[row + i][col + i] == '' or self.grid[row + i][col + i] == word[i] for i in range(len(word)))
-            )
-
-    # can_place_word helper function: to validate diagonal TR -> BL word placement
-    def _can_place_diagonal_tr_bl(self, word, row, col):
-        return (
-            row + len(word) <= self.rows and col >= len(word) - 1 and
-            all(self.grid[row + i][col - i] == '' or self.grid[row + i][col - i] == word[i] for i in range(len(word)))
-        )
-
-    # can_place_word helper function: to validate diagonal BL -> TR word placement
-    def _can_place_diagonal_bl_tr(self, word, row, col):
-        return (
-            row >= len(word) - 1 and col + len(word) <= self.cols and
-            all(self.grid[row - i][col + i] == '' or self.grid[row - i][col + i] == word[i] for i in range(len(word)))
-        )
-
-    # can_place_word helper function: to validate diagonal BR -> TL word placement
-    def _can_place_diagonal_br_tl(self, word, row, col):
-        return (
-            row >= len(word) - 1 and col >= len(word) - 1 and
-            all(self.grid[row - i][col - i] == '' or self.grid[row - i][col - i] == word[i] for i in range(len(word)))
-        )
+        self.can_place_calls += 1
+        if direction not in DIRECTION_STEPS:
+            raise ValueError("Invalid direction")
+        return self.state.fits(word.upper(), row, col, direction)  # the grid only holds upper case letters
 
     # fuction: place word in grid
     def place_word(self, word, row, col, direction):
-        # initializing 
-        start_row = 0
-        start_col = 0
-        end_row = 0 
-        end_col = 0
-        word_length = len(word)
-
         word = word.upper()  # convert word to upper case
-        if direction == "horizontal":
-            for i in range(len(word)):
-                self.grid[row][col + i] = word[i]
-            start_row, start_col = row, col
-            end_row, end_col = row, col + word_length - 1
-        elif direction == "horizontal_backward":
-            for i in range(len(word)):
-                self.grid[row][col - i] = word[i]
-            start_row, start_col = row, col - word_length + 1
-            end_row, end_col = row, col
-        elif direction == "vertical":
-            for i in range(len(word)):
-                self.grid[row + i][col] = word[i]
-                start_row, start_col = row, col
-                end_row, end_col = row + word_length - 1, col
-        elif direction == "vertical_upward":
-            for i in range(len(word)):
-                self.grid[row - i][col] = word[i]
-                start_row, start_col = row, col
-                end_row, end_col = row - word_length + 1, col
-        elif direction.startswith("diagonal"):
-            if direction == "diagonal_tl_br":
-                for i in range(len(word)):
-                    self.grid[row + i][col + i] = word[i]
-                    start_row, start_col = row, col
-                    end_row = row + word_length - 1
-                    end_col = col + word_length - 1
-            elif direction == "diagonal_tr_bl":
-                for i in range(len(word)):
-                    self.grid[row + i][col - i] = word[i]
-                    start_row, start_col = row, col
-                    end_row = row + word_length - 1
-                    end_col = col - word_length + 1
-            elif direction == "diagonal_bl_tr":
-                for i in range(len(word)):
-                    self.grid[row - i][col + i] = word[i]
-                    start_row, start_col = row, col
-                    end_row = row - word_length + 1
-                    end_col = col + word_length - 1
-            elif direction == "diagonal_br_tl":
-                for i in range(len(word)):
-                    self.grid[row - i][col - i] = word[i]
-                    start_row, start_col = row, col
-                    end_row = row - word_length + 1
-                    end_col = col - word_length + 1
-
-        # Print word with placement info for debugging
-        if self.debug:  # Check if debugging is enabled
-            human_start_row = start_row + 1
-            human_start_col = start_col +1
-            human_end_row = end_row + 1
-            human_end_col = end_col + 1
-            print(f"Placed word '{word}' starts at ({human_start_row}, {human_start_col}) and ends at ({human_end_row}, {human_end_col}) for direction '{direction}'")
+        row_step, col_step = DIRECTION_STEPS[direction]
+
+        # the start is always the cell of the first letter, the end the cell of the last letter
+        start_row, start_col = row, col
+        end_row = row + (len(word) - 1) * row_step
+        end_col = col + (len(word) - 1) * col_step
 
+        self.state.place(word, row, col, direction)
         self.placement_info.append((word, start_row, start_col, end_row, end_col, direction))
 
+    # function: Remove the most recently placed word
+        # letters shared with words placed earlier stay in the grid
+    def undo_last_word(self):
+        self.state.undo()
+        self.placement_info.pop()
+
     # function: Generate all possible positions for a word in a specific direction
+        # All anchors are checked at once: for letter i the grid is sliced so that
+        # slice[r][c] is the cell letter i would land on when the word starts at (r, c)
     def possible_positions(self, word, direction):
-        positions = []
-        for row in range(self.rows):  
-            for col in range(self.cols):  
-                if self.can_place_word(word, row, col, direction):  
-                    positions.append((row, col))
-        
-        # Print possible psoitions for debugging
-        if self.debug:  # Check if debugging is enabled
-            print(f'word to be plced: {word}')
-            print(f'Generated Possible Positions')
-            print(f'{positions}')
-
-        return positions
+        if direction not in DIRECTION_STEPS:
+            raise ValueError("Invalid direction")
+        self.position_scans += 1
+        import numpy as np
+
+        word = word.upper()
+        word_length = len(word)
+        row_step, col_step = DIRECTION_STEPS[direction]
+        row_start, row_stop = anchor_range(self.rows, row_step, word_length)
+        col_start, col_stop = anchor_range(self.cols, col_step, word_length)
+        if row_start >= row_stop or col_start >= col_stop:
+            return []
+
+        anchor_rows = row_stop - row_start
+        anchor_cols = col_stop - col_start
+        grid_codes = self.state.as_array()
+        fits = np.ones((anchor_rows, anchor_cols), dtype=bool)
+        for i in range(word_length):
+            top = row_start + i * row_step
+            left = col_start + i * col_step
+            cells = grid_codes[top:top + anchor_rows, left:left + anchor_cols]
+            fits &= (cells == 0) | (cells == ord(word[i]))
+            if not fits.any():
+                break
+
+        anchor_row_idx, anchor_col_idx = np.nonzero(fits)
+        return list(zip((anchor_row_idx + row_start).tolist(), (anchor_col_idx + col_start).tolist()))
+
+    # function: Generate the legal placements of a word that cross an already placed letter
+        # Built from the letter index: every cell holding letter i of the word is the anchor
+        # of one placement per direction, so the cost is O(occurrences) instead of a grid scan.
+    def crossing_placements(self, word):
+        word = word.upper()
+        crossings = []
+        seen = set()
+        for i, letter in enumerate(word):
+            for cell_row, cell_col in self.state.letter_positions(letter):
+                for direction in DIRECTIONS:
+                    row_step, col_step = DIRECTION_STEPS[direction]
+                    placement = (cell_row - i * row_step, cell_col - i * col_step, direction)
+                    if placement in seen:
+                        continue
+                    seen.add(placement)
+                    if self.can_place_word(word, *placement):
+                        crossings.append(placement)
+        return crossings
+
+    # function: Generate the placements of a word in the order the backtracking solver tries them
+        # With probability overlap the placements crossing placed words come first (shuffled),
+        # then every direction is scanned in random order as before, skipping the crossings
+        # already tried. An overlap of 0 leaves the order (and the random stream) unchanged.
+    def ordered_placements(self, word, overlap=0.0):
+        tried = set()
+        if self.rows * self.cols > SAMPLED_PLACEMENT_CELLS:
+            yield from self.sampled_placements(word, overlap, tried)
+        elif overlap and self.random.random() < overlap:
+            crossings = self.crossing_placements(word)
+            self.random.shuffle(crossings)
+            tried.update(crossings)
+            yield from crossings
+
+        directions = DIRECTIONS.copy()
+        self.random.shuffle(directions) # shuffle directions
+
+        for direction in directions:
+            positions = self.possible_positions(word, direction)
+            self.random.shuffle(positions) # shuffle positions
+
+            for row, col in positions:
+                if (row, col, direction) not in tried:
+                    yield row, col, direction
+
+    # function: Generate a few random placements of a word on a large grid
+        # Mega grids would pay a scan of every crossing (or every anchor) per word, so first
+        # PLACEMENT_SAMPLES random crossings (with probability overlap) and then as many random
+        # anchors are checked, which costs the same however large the grid is. The fitting ones
+        # are added to tried so the full scan that follows does not repeat them.
+    def sampled_placements(self, word, overlap, tried):
+        word = word.upper()
+        if overlap and self.random.random() < overlap:
+            letter_cells = {letter: sorted(self.state.letter_cells.get(ord(letter), ())) for letter in set(word)}
+            for _ in range(PLACEMENT_SAMPLES):
+                i = self.random.randrange(len(word))
+                cells = letter_cells[word[i]]
+                if not cells:
+                    continue
+                cell_row, cell_col = divmod(cells[self.random.randrange(len(cells))], self.cols)
+                direction = self.random.choice(DIRECTIONS)
+                row_step, col_step = DIRECTION_STEPS[direction]
+                placement = (cell_row - i * row_step, cell_col - i * col_step, direction)
+                if placement not in tried and self.can_place_word(word, *placement):
+                    tried.add(placement)
+                    yield placement
+
+        for _ in range(PLACEMENT_SAMPLES):
+            direction = self.random.choice(DIRECTIONS)
+            row_step, col_step = DIRECTION_STEPS[direction]
+            row_start, row_stop = anchor_range(self.rows, row_step, len(word))
+            col_start, col_stop = anchor_range(self.cols, col_step, len(word))
+            if row_start >= row_stop or col_start >= col_stop:
+                continue
+            placement = (self.random.randrange(row_start, row_stop), self.random.randrange(col_start, col_stop), direction)
+            if placement not in tried and self.can_place_word(word, *placement):
+                tried.add(placement)
+                yield placement
+
+    # function: Generate all possible (row, col, direction) placements for a word
+    def candidate_placements(self, word):
+        candidates = []
+        for direction in DIRECTIONS:
+            for row, col in self.possible_positions(word, direction):
+                candidates.append((row, col, direction))
+        return candidates
 
     # function: Backtracing algorithm for proper word placement
-        # Shuffling the directions and positions for equal distribution of words
-    def backtracing_word_placement(self, word_index, words_not_placed, remaining_words):
-        if word_index == len(remaining_words):
+        # Words are placed in input order; shuffling the directions and positions gives an
+        # equal distribution of words. Stops after node_budget placements or time_budget seconds.
+        # If not every word fits, the best partial placement found is kept.
+        # overlap: probability (0-1) of trying the placements that cross placed words first
+        # restart_unit: restart the search after restart_unit * luby(n) placements (None: never)
+    def backtracking_word_placement(self, node_budget=None, time_budget=None, overlap=0.0, restart_unit=None):
+        words = self._start_placement(node_budget, time_budget, overlap)
+        unplaced = self._fitting_words(words)
+        complete = self._search_with_restarts(lambda: self._backtracking_search(words, unplaced, 0, []), restart_unit, len(unplaced))
+        return self._finish_placement(words, complete, "Backtracking")
+
+    # backtracking_word_placement helper function: recursive search step
+    def _backtracking_search(self, words, order, word_index, placed):
+        if len(placed) > len(self._best_placement):
+            self._best_placement = list(placed)
+        if word_index == len(order):
             return True
 
-        # remove spaces from word while seting the word
-        original_word = self.remaining_words[word_index]
-        word = self.remaining_words[word_index].replace(" ", "")
-
-        # Skip blank words
-        if not word.strip():
-            self.remaining_words.remove(word)
-            return self.backtracing_word_placement(word_index, words_not_placed, remaining_words)
+        index = order[word_index]
+        word = words[index][1]
 
-        directions = [
-            "horizontal", "horizontal_backward",
-            "vertical", "vertical_upward",
-            "diagonal_tl_br", "diagonal_tr_bl", "diagonal_bl_tr", "diagonal_br_tl"
-        ]
-        random.shuffle(directions) # shuffle directions
+        for row, col, direction in self.ordered_placements(word, self._overlap):
+            if self._budget_exhausted():
+                return False
+            self.nodes_visited += 1
 
-        word_placed = False
+            self.place_word(word, row, col, direction)
+            placed.append((index, row, col, direction))
 
-        for direction in directions:
-            positions = self.possible_positions(word, direction)
-            random.shuffle(positions) # shuffle positions
+            if self._backtracking_search(words, order, word_index + 1, placed):
+                return True
 
-            for row, col in positions:
-                if self.can_place_word(word, row, col, direction):
-                    self.place_word(word,row,col, direction)
-                    self.placed_words.append(word)
-                    self.remaining_words.remove(original_word)
+            placed.pop()
+            self.undo_last_word()
+            self.backtracks += 1
 
-                if self.backtracing_word_placement(word_index + 1, words_not_placed, remaining_words):
-                    return True
+        return False
 
-                self.clear_cells(row, col, direction, len(word))
-                self.placed_words.pop()
-                self.remaining_words.append(word)
+    # function: Constraint propagating word placement
+        # The word with the fewest legal slots is placed next (longest first on ties),
+        # a branch is pruned as soon as any remaining word has no slot left (forward checking),
+        # and the search stops after node_budget placements or time_budget seconds.
+        # If not every word fits, the best partial placement found is kept.
+        # overlap: probability (0-1) of trying the placements that cross placed words first
+        # restart_unit: restart the search after restart_unit * luby(n) placements (None: never)
+    def constraint_word_placement(self, node_budget=None, time_budget=None, overlap=0.0, restart_unit=None):
+        words = self._start_placement(node_budget, time_budget, overlap)
+        unplaced = self._fitting_words(words)
+        complete = self._search_with_restarts(lambda: self._constraint_search(words, unplaced, []), restart_unit, len(unplaced))
+        return self._finish_placement(words, complete, "Constraint")
+
+    # constraint_word_placement helper function: recursive search step
+    def _constraint_search(self, words, unplaced, placed):
+        if len(placed) > len(self._best_placement):
+            self._best_placement = list(placed)
+        if not unplaced:
+            return True
 
-        if not word_placed:
-            self.words_not_placed.append(word)
+        # forward checking: every remaining word needs a slot, pick the most constrained one
+        best = None
+        for index in unplaced:
+            word = words[index][1]
+            candidates = self.candidate_placements(word)
+            if not candidates:
+                return False
+            rank = (len(candidates), -len(word))
+            if best is None or rank < best[0]:
+                best = (rank, index, candidates)
+        _, index, candidates = best
+        word = words[index][1]
+        self.random.shuffle(candidates)
+        if self._overlap and self.random.random() < self._overlap:
+            candidates.sort(key=lambda candidate: not self.state.crosses(len(word), *candidate))
+
+        remaining = [other for other in unplaced if other != index]
+        for row, col, direction in candidates:
+            if self._budget_exhausted():
+                return False
+            self.nodes_visited += 1
+
+            self.place_word(word, row, col, direction)
+            placed.append((index, row, col, direction))
+
+            if self._constraint_search(words, remaining, placed):
+                return True
+
+            placed.pop()
+            self.undo_last_word()
+            self.backtracks += 1
 
         return False
 
-    # function: Remove words by clearing cells if not properly placed
-    def clear_cells(self, row, col, direction, word_length):
-        if direction == "horizontal":
-            for i in range(word_length):
-                self.grid[row][col + i] = ''
-        elif direction == "horizontal_backward":
-            for i in range(word_length):
-                self.grid[row][col - i] = ''
-        elif direction == "vertical":
-            for i in range(word_length):
-                self.grid[row + i][col] = ''
-        elif direction == "vertical_upward":
-            for i in range(word_length):
-                self.grid[row - i][col] = ''
-        elif direction == "diagonal_tl_br":
-            for i in range(word_length):
-                self.grid[row + i][col + i] = ''
-        elif direction == "diagonal_tr_bl":
-            for i in range(word_length):
-                self.grid[row + i][col - i] = ''
-        elif direction == "diagonal_bl_tr":
-            for i in range(word_length):
-                self.grid[row - i][col + i] = ''
-        elif direction == "diagonal_br_tl":
-            for i in range(word_length):
-                self.grid[row - i][col - i] = ''
+    # placement helper function: reset the search counters and list the words to place
+        # returns (original word, word without spaces) pairs, blank words are skipped
+    def _start_placement(self, node_budget, time_budget, overlap):
+        self.nodes_visited = 0
+        self.restarts = 0
+        self._overlap = overlap
+        self._node_budget = node_budget
+        self._deadline = None if time_budget is None else time.perf_counter() + time_budget
+        self.timed_out = False
+        self._best_placement = []
+
+        words = []
+        for original_word in self.remaining_words:
+            word = original_word.replace(" ", "")
+            if word.strip():
+                words.append((original_word, word))
+
+        # both solvers recurse one level per word, so mega word lists need a deeper stack
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * len(words) + 1000))
+        return words
+
+    # placement helper function: run a search, restarting it on an empty grid at Luby cutoffs
+        # Run n may place restart_unit * luby(n) words before it is abandoned, so an unlucky
+        # shuffle costs a bounded number of nodes. The random stream carries on across restarts,
+        # so every run explores a different order; the best partial placement is kept over all
+        # runs. Stops when a run completes, the whole search space was exhausted, or the
+        # overall node/time budget is used up. The unit is at least the word count, so a run
+        # of a long word list is not cut off before it could place every word once.
+    def _search_with_restarts(self, search, restart_unit, word_count=0):
+        if restart_unit is None:
+            return search()
+
+        restart_unit = max(restart_unit, word_count)
+        node_budget = self._node_budget
+        run = 1
+        while True:
+            cutoff = self.nodes_visited + restart_unit * luby(run)
+            self._node_budget = cutoff if node_budget is None else min(cutoff, node_budget)
+            complete = search()
+            exhausted = self._budget_exhausted()
+            self._node_budget = node_budget
+            if complete or not exhausted or self._budget_exhausted():
+                return complete
+
+            # take the abandoned run back out of the grid
+            while self.placement_info:
+                self.undo_last_word()
+            self.restarts += 1
+            run += 1
+
+    # placement helper function: indexes of the words that fit at least on an empty grid
+        # On an empty grid every anchor of a line fits, so a word fits exactly when it is no
+        # longer than the longer side; no placement scan needed.
+    def _fitting_words(self, words):
+        longest_line = max(self.rows, self.cols)
+        return [index for index, (_, word) in enumerate(words) if len(word) <= longest_line]
+
+    # placement helper function: True once the node or time budget is used up
+    def _budget_exhausted(self):
+        if self._node_budget is not None and self.nodes_visited >= self._node_budget:
+            return True
+        if self.cancel_check is not None and self.cancel_check(self.attempt):
+            return True
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    # placement helper function: keep the best placement and sort the words into placed / not placed
+    def _finish_placement(self, words, complete, solver_name):
+        if not complete:
+            # rebuild the best partial placement on a clean grid
+            self.fill_grid()
+            self.placement_info = []
+            for index, row, col, direction in self._best_placement:
+                self.place_word(words[index][1], row, col, direction)
+
+        placed_indexes = {index for index, _, _, _ in self._best_placement}
+        self.placed_words = [words[index][1] for index, _, _, _ in self._best_placement]
+        self.remaining_words = [words[index][0] for index in range(len(words)) if index not in placed_indexes]
+        self.words_not_placed = [words[index][1] for index in range(len(words)) if index not in placed_indexes]
+
+        if self.debug:
+            print(f'{solver_name} placement visited {self.nodes_visited} nodes, complete: {complete}')
+
+        return not self.words_not_placed
 
     # function: generate word find puzzle
-    def generate_puzzle(self, current_word_list):
+        # solver: "backtracking" or "constraint", both stop after node_budget placements or time_budget seconds
+        # fill: "random" letters, or "unique" letters that never spell an extra listed word
+        # overlap: probability (0-1) of trying placements that cross placed words first
+        # restart_unit: restart the solver at Luby cutoffs of this many placements (None: never)
+    def generate_puzzle(self, current_word_list, solver="backtracking", node_budget=None, time_budget=None, fill="random", overlap=0.0, restart_unit=None):
 
         # fill the grid with empty strings
         self.fill_grid()
 
-        # place the words in the empty grid using backtracing
-        self.backtracing_word_placement(0, self.words_not_placed, self.remaining_words)
+        # place the words in the empty grid
+        if self.instrumented:
+            phase_start = time.perf_counter()
+        if solver == "constraint":
+            self.constraint_word_placement(node_budget, time_budget, overlap, restart_unit)
+        elif solver == "backtracking":
+            self.backtracking_word_placement(node_budget, time_budget, overlap, restart_unit)
+        else:
+            raise ValueError(f"Invalid solver: {solver}")
+        if self.instrumented:
+            self.timings["placement"] = time.perf_counter() - phase_start
+            phase_start = time.perf_counter()
 
         # fill the grid with random letters
-        self.fill_grid_random()
+        if fill == "unique":
+            self.fill_grid_unique()
+        elif fill == "random":
+            self.fill_grid_random()
+        else:
+            raise ValueError(f"Invalid fill: {fill}")
+        if self.instrumented:
+            self.timings["fill"] = time.perf_counter() - phase_start
 
         # Print grid for debuging [if enabled]
         if self.debug:
@@ -334,8 +1028,43 @@ class WordFindPuzzleGenerator:
             if self.words_not_placed:
                 print("Words not placed:", ", ".join(self.words_not_placed))
 
+    # function: check that every placed word appears exactly once in the finished grid
+        # returns (and keeps) the words found a different number of times with their counts
+    def verify_occurrences(self):
+        self.ambiguous_words = ambiguous_words(self.grid, self.placed_words)
+        if self.debug and self.ambiguous_words:
+            print("Words not found exactly once:", self.ambiguous_words)
+        return self.ambiguous_words
+
+    # function: finished puzzle as a JSON-serializable dict for PuzzleCache
+    def cache_entry(self):
+        return {
+            "rows": self.rows,
+            "cols": self.cols,
+            "seed": self.seed,
+            "attempt": self.attempt,
+            "grid": ["".join(row) for row in self.grid],
+            "placement_info": [list(info) for info in self.placement_info],
+            "placed_words": self.placed_words,
+            "words_not_placed": self.words_not_placed,
+            "remaining_words": self.remaining_words
+        }
+
+    # function: restore a finished puzzle from a PuzzleCache entry (the generator must have its size)
+    def load_cache_entry(self, entry):
+        for row, letters in enumerate(entry["grid"]):
+            for col, letter in enumerate(letters):
+                self.state.set_letter(row, col, letter)
+        self.placement_info = [tuple(info) for info in entry["placement_info"]]
+        self.placed_words = entry["placed_words"]
+        self.words_not_placed = entry["words_not_placed"]
+        self.remaining_words = entry["remaining_words"]
+        self.attempt = entry["attempt"]
+        self.cached = True
+
     # function: generate readable table from the grid using PrettyTable
     def generate_pretty_table(self):
+        from prettytable import PrettyTable
         table = PrettyTable(border=False, header=False, align="c", valign="b", padding_width=1)
 
         # add columns to thble [must equal the number of columns in the grid]
@@ -344,9 +1073,10 @@ class WordFindPuzzleGenerator:
             table.add_column("", [""] * self.rows)
 
         # Populate the table with the letters from the grid
-        for i in range(self.cols):
+        grid = self.grid
+        for i in range(self.rows):
             for j in range(self.cols):
-                table._rows[i][j] = self.grid[i][j]
+                table._rows[i][j] = grid[i][j]
 
         # Debug info: Print Table, and row/column counts
         if self.debug:
@@ -365,73 +1095,77 @@ class WordFindPuzzleGenerator:
 
         return table
 
+    # function: True when the grid runs off a letter page, so puzzle and solution get poster pages
+    def needs_poster(self):
+        layout = get_page_layout(self.rows, self.cols, self.font_size, self.title_font_size, self.cell_width, self.cell_height, LETTER, "puzzle")
+        return not layout.grid_fits_page()
+
+    # function: size of a poster page: the full size grid with its title and word_rows word list rows
+        # one inch margins all around, never smaller than a letter page
+    def poster_pagesize(self, word_rows=0):
+        width = (self.cols + 1) * self.cell_width + 72 * 2
+        height = 72 * 2 + self.title_font_size * 2 + (self.rows + 3) * self.cell_height + word_rows * self.font_size * 2
+        return max(width, LETTER[0]), max(height, LETTER[1])
+
     # function: generate pdf for puzzle
+        # Grids or word lists that would run off a letter page are drawn on a poster page sized
+        # to fit them, with as many word list columns as its width takes.
     def generate_pdf(self, title, word_list, pdf_path, c):
-        
+
         ### START Page Setup ###
 
         # set the font
-        pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        font = "DejaVuSans"
+        font = FONTS.register('DejaVuSans', 'DejaVuSans.ttf')
 
-        # set the margins (1 inch = 72 points)
-        top_margin = 72
-        bottom_margin = 72
-        left_margin = 72
-        right_margin = 72
-
-        # calculate the effective page size with margins
-        pagesize_with_margines = (
-            pagesizes.letter[0] - left_margin - right_margin,
-            pagesizes.letter[1] - top_margin - bottom_margin
-        )
-        # debug info: Print font sizes
-        if self.debug:
-            print(f'Effective page width: {pagesize_with_margines[0]}')
-            print(f'Effective page height: {pagesize_with_margines[1]}')
+        # Remove blank words from the word list
+        word_list = [word for word in word_list if word.strip()]
 
-        ### END Page Setup ###
+        # Add check box to start of word
+        word_list = [f"\u2610 {word}" for word in word_list]
 
-        ### START Title Processing ###
+        # calculate the number of colomns
+        min_words_per_column = 5
+        total_words = len(word_list)
 
-        # Set title font size
+        # calculate the number of columns with a minimum of 2 columns
+        max_columns = 4
+        num_columns = min(max_columns, (total_words + min_words_per_column - 1) // min_words_per_column)
 
-        c.setFont(font, self.title_font_size)
+        # calculate the number of words per column
+        words_per_column = (len(word_list) + num_columns - 1) // num_columns
 
-        # debug info: Print font sizes
+        # calculate the maximum words column_width
+        max_word_width = max(FONTS.string_width(word, font, self.font_size) for word in word_list)
+
+        # every coordinate of the page comes from the shared layout
+        layout = get_page_layout(self.rows, self.cols, self.font_size, self.title_font_size, self.cell_width, self.cell_height, LETTER, "puzzle")
+        if not layout.grid_fits_page() or layout.word_list_row_y(words_per_column - 1) < 0:
+            max_columns = max(max_columns, int((self.poster_pagesize()[0] - 72 * 2) // (max_word_width + 18)))
+            num_columns = min(max_columns, (total_words + min_words_per_column - 1) // min_words_per_column)
+            words_per_column = (len(word_list) + num_columns - 1) // num_columns
+            layout = get_page_layout(self.rows, self.cols, self.font_size, self.title_font_size, self.cell_width, self.cell_height, self.poster_pagesize(words_per_column), "poster")
+        c.setPageSize((layout.page_width, layout.page_height))
+
+        # debug info: Print the page layout
         if self.debug:
+            print(f'Effective page width: {layout.content_width}')
+            print(f'Effective page height: {layout.content_height}')
             print(f'Font Size: {self.font_size}')
             print(f'Title Font Size: {self.title_font_size}')
+            print(f"Grid starting X: {layout.grid_x}")
+            print(f"Grid starting y: {layout.grid_y}")
 
-        # Remove the quote marks (") from the title
-        title = title.replace('"', '')
-
-        if self.debug:
-            print(f'Title: {title}')
-
-        # calculate the title width
-        title_width = c.stringWidth(title, font, self.title_font_size)
-
-        # debug info: Print the title width
-        if self.debug:
-            print(f"Title width: {title_width}")
-
-        # Calculate the x coordinate for centering the title
-        title_x = (letter[0] - title_width) / 2
-
-        # debug info: Print the title x-coordinate
-        if self.debug:
-            print(f"Title x-cordinate: {title_x}")
+        ### END Page Setup ###
 
-        # Set title y coordinate
-        title_y = 750
+        ### START Title Processing ###
 
-        # debug info: Print the title y-coordinate
-        if self.debug:
-            print(f"Title y-cordinate: {title_y}")
+        # Remove the quote marks (") from the title
+        title = title.replace('"', '')
 
         # Draw the centered title on the page
-        c.drawString(title_x, title_y, title)  # Adjust the y-coordinate (750) as needed
+        c.setFont(font, self.title_font_size)
+        title_width = FONTS.string_width(title, font, self.title_font_size)
+        c.drawString(layout.title_x(title_width), layout.title_y, title)
 
         ### END Title Processing ###
 
@@ -440,125 +1174,33 @@ class WordFindPuzzleGenerator:
         # set grid/word list font size
         c.setFont(font, self.font_size)
 
-        # Calculate the grid width and height
-        grid_width = self.cols * self.cell_width
-        grid_height = self.rows * self.cell_height
-
-        # debug info: Print the grid width & height
-        if self.debug:
-            print(f"Grid Width: {grid_width}")
-            print(f"Grid Height: {grid_height}")
-
-        # calculate the offsets for centering the grid
-        horizontal_offset = (pagesize_with_margines[0] - grid_width) / 2
-        vertical_offset = (pagesize_with_margines[1] - grid_height) / 2 # + 0 Adjust the value as needed to offset the Y-coordinate
-
-        # debug info: Print the horizontal & vertical offset
-        if self.debug:
-            print(f"horizontal Offset: {horizontal_offset}")
-            print(f"Vertical Offset: {vertical_offset}")
-
-        # calculate the starting coordinates for the grid
-        grid_x = left_margin + horizontal_offset
-        grid_y = title_y - top_margin * 2 - vertical_offset - self.title_font_size 
-        # old: grid_y = bottom_margin + vertical_offset
-
-        # debug info: Print the starting coordinates
-        if self.debug:
-            print(f"Grid starting X: {grid_x}")
-            print(f"Grid starting y: {grid_y}")
-
         # Darw the centered grid
-        for row_idx, row in enumerate(self.grid):
-            for col_idx, cell_value in enumerate(row):
-
-                # calculate the center of the cell
-                cell_center_x = grid_x + col_idx * self.cell_width + self.cell_width / 2
-                cell_center_y = grid_y + (self.rows - row_idx - 1) * self.cell_height + self.cell_height / 2
-
-                x = cell_center_x - c.stringWidth(cell_value, font, self.font_size) / 2
+        for row, centers in zip(self.grid, layout.cell_centers):
+            for cell_value, (cell_center_x, cell_center_y) in zip(row, centers):
+                x = cell_center_x - FONTS.string_width(cell_value, font, self.font_size) / 2
                 y = cell_center_y - self.font_size / 2
                 c.drawString(x, y, cell_value)
 
-        # debug info: draw parameters
-        if self.debug:
-            print(f'Cell center x-coordinate: {cell_center_x}')
-            print(f'Cell center y-coordinate: {cell_center_y}')
-            print(f'Grid x-coordinate: {x}')
-            print(f'Grid y-coordinate: {y}')
-
         # Set border perameters
         c.setStrokeColorRGB(0, 0, 0) # adjust for color
         c.setLineWidth(2) # adjust for thingness
 
-        # calculate the starting coordinates for the boarder
-        border_x = grid_x - self.cell_width / 1.75
-        border_y = grid_y - self.cell_height / 1.75
-
-        # debug info: border start coordinates
-        if self.debug:
-            print(f'Border starting x-coordinate: {border_x}')
-            print(f'Border starting y-coordinate: {border_y}')
-
         # Draw a boarder around the grid
-        c.rect(border_x, border_y, grid_width + self.cell_width, grid_height + self.cell_height, stroke = 1, fill = 0)
+        c.rect(*layout.border, stroke = 1, fill = 0)
 
         ### END  Grid Processing ###
 
         ### START Word List Processing ###
 
-        # Remove blank words from the word list
-        word_list = [word for word in word_list if word.strip()]
-        
-        # Add check box to start of word
-        word_list = [f"\u2610 {word}" for word in word_list]
-
-        # calculate the number of colomns
-        min_words_per_column = 5
-        total_words = len(word_list)
-
-        # debug info: Print the count of words
+        # debug info: Print the word list shape
         if self.debug:
             print(f'Total words: {total_words}')
-
-        # calculate the number of columns with a minimum of 2 columns
-        max_columns = 4
-        num_columns = min(max_columns, (total_words + min_words_per_column - 1) // min_words_per_column)
-        # ols max(2, total_words // min_words_per_column)
-
-        # debug info: Print the number of columns
-        if self.debug:
             print(f'Number of Columns: {num_columns}')
-
-        # calculate the number of words per column
-        words_per_column = (len(word_list) + num_columns - 1) // num_columns
-
-        # debug info: Print the number of words per column
-        if self.debug:
             print(f'Words per column: {words_per_column}')
-
-        # calculate the maximum words column_width
-        max_word_width = max(c.stringWidth(word, font, self.font_size) for word in word_list)
-
-        # debug info: Print the max word width
-        if self.debug:
             print(f'Max word width: {max_word_width}')
 
-        # calculate the column spacing
-        column_spacing = (((pagesize_with_margines[0] - (max_word_width * num_columns)) / num_columns - 1)) + 18
-
-        # debug info: Print the column width
-        if self.debug:
-            print(f'Column column_spacing: {column_spacing}')
-
-        # calculate the width of each solumn
-        column_width = max_word_width + column_spacing
-
-        # debug info: Print the column width
-        if self.debug:
-            print(f'Column Width: {column_width}')
-
         # Create PrettyTable for word list
+        from prettytable import PrettyTable
         word_list_table = PrettyTable(border = False, header = False, align = "l", valign = "c")
 
         # add columns to word_list_table
@@ -581,409 +1223,1789 @@ class WordFindPuzzleGenerator:
             print(f"Number of columns: {word_list_table.field_names}")
             print(f"Number of rows: {len(word_list_table._rows)}")
 
-        # calculate the x-coordinate for starting the word list
-        word_list_x = left_margin + horizontal_offset / 2
-
-        # debug info: Print the x coordinate of the word list
-        if self.debug:
-            print(f'Word list x-coordinate: {word_list_x}')
-
-        # calculate the y-coordinate for starting the word list
-        word_list_y = grid_y - vertical_offset + bottom_margin * 1.75
-
-        # debug info: Print the y coordinate of the word list
-        if self.debug:
-            print(f'Word list y-coordinate: {word_list_y}')
-        
         # Draw the word list table by Looping through the rows and columns of the word list table
+        column_xs = layout.word_list_column_xs(num_columns, max_word_width)
         for row_idx, row in enumerate(word_list_table._rows):
+            column_y = layout.word_list_row_y(row_idx)
             for col_idx, cell_value in enumerate(row):
-
-                # calculate the x coordiante for the cell
-                column_x = word_list_x + (col_idx * column_width) - (self.cell_width / 1.75)
-
-                # calculate the y coordinate for the cell
-                column_y = word_list_y - row_idx * (self.font_size + self.font_size)
-
-                # draw the cell text
-                c.drawString(column_x, column_y, cell_value)
-
-                if self.debug:
-                    print(f'Column X coordinate: {column_x}')
-                    print(f'Column Y coordinate: {column_y}')
+                c.drawString(column_xs[col_idx], column_y, cell_value)
 
         ### END Word List Processing
 
-    def generate_solution_pdf(self, title, solution_pdf_path, solution_canvas, second_grid):
-        
+    # function: draw the solution grid of the puzzle into one N-up slot of a solution page
+        # slot is (grids per page, index on the page), see NUP_ARRANGEMENTS, or "poster" for a
+        # full size grid on a page of its own (the caller sets the canvas to poster_pagesize())
+    def generate_solution_pdf(self, title, solution_pdf_path, solution_canvas, slot=(2, 0)):
+
          ### START Page Setup ###
 
         # set the font
-        pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        font = "DejaVuSans"
+        font = FONTS.register('DejaVuSans', 'DejaVuSans.ttf')
 
-        # set the margins (1 inch = 72 points)
-        top_margin = 72
-        bottom_margin = 72
-        left_margin = 72
-        right_margin = 72
+        # every coordinate of the slot comes from the shared layout
+        pagesize = self.poster_pagesize() if slot == "poster" else LETTER
+        layout = get_page_layout(self.rows, self.cols, self.font_size, self.title_font_size, self.cell_width, self.cell_height, pagesize, slot)
 
-        # calculate the effective page size with margins
-        pagesize_with_margines = (
-            pagesizes.letter[0] - left_margin - right_margin,
-            pagesizes.letter[1] - top_margin - bottom_margin
-        )
-        # debug info: Print font sizes
+        # debug info: Print the slot layout
         if self.debug:
-            print(f'Effective page width: {pagesize_with_margines[0]}')
-            print(f'Effective page height: {pagesize_with_margines[1]}')
+            print(f'Solution slot: {slot}')
+            print(f'Font Size: {layout.font_size}')
+            print(f'Title Font Size: {layout.title_font_size}')
+            print(f"Grid starting X: {layout.grid_x}")
+            print(f"Grid starting y: {layout.grid_y}")
 
         ### END Page Setup ###
 
         ### START handling the Grid and title ###
 
-        # debug info: Print font sizes
-        if self.debug:
-            print(f'Font Size: {self.font_size}')
-            print(f'Title Font Size: {self.title_font_size}')
-
         # Remove the quote marks (") from the title
         title = title.replace('"', '')
 
-        if self.debug:
-            print(f'Title: {title}')
-
-        # calculate the title width
-        title_width = solution_canvas.stringWidth(title, font, self.title_font_size)
-
-        # debug info: Print the title width
-        if self.debug:
-            print(f"Title width: {title_width}")
-
-        
-        # Calculate the grid width and height
-        grid_width = self.cols * self.cell_width
-        grid_height = self.rows * self.cell_height
-
-        # debug info: Print the grid width & height
-        if self.debug:
-            print(f"Grid Width: {grid_width}")
-            print(f"Grid Height: {grid_height}")
-
-        # calculate the offsets for centering the grid
-        horizontal_offset = (pagesize_with_margines[0] - grid_width) / 2
-        vertical_offset = (pagesize_with_margines[1] - grid_height) / 2 
-
-        # debug info: Print the horizontal & vertical offset
-        if self.debug:
-            print(f"horizontal Offset: {horizontal_offset}")
-            print(f"Vertical Offset: {vertical_offset}")
-
-        # calculate the starting coordinates for the grid
-        grid_x = left_margin + horizontal_offset
-        if not second_grid:
-            grid_y = letter[1] - top_margin * 2 - vertical_offset - (self.title_font_size * 2)
-        else:
-            grid_y = (letter[1]/2) - top_margin * 1.75 - vertical_offset - (self.title_font_size * 2)
-        # old: grid_y = bottom_margin + vertical_offset
-
-        # debug info: Print the starting coordinates
-        if self.debug:
-            print(f"Grid starting X: {grid_x}")
-            print(f"Grid starting y: {grid_y}")
-
-         # Calculate the x coordinate for centering the title
-        title_x = (letter[0] - title_width) / 2
-
-        # debug info: Print the title x-coordinate
-        if self.debug:
-            print(f"Title x-cordinate: {title_x}")
-
-        # Set title y coordinate
-        if not second_grid:
-            title_y = letter[1] - (0.5 * top_margin) - (self.title_font_size /2)
-        else:
-            title_y = (letter[1]/2) - (0.25 * top_margin) - (self.title_font_size /2)
-
-
-        # debug info: Print the title y-coordinate
-        if self.debug:
-            print(f"Title y-cordinate: {title_y}")
-
         # draw encapsulation lines and half-circles
-        self.draw_encapsulation(solution_canvas, grid_x, grid_y)
+        self.draw_encapsulation(solution_canvas, layout)
 
         # Darw the title and centered grid
-
-        solution_canvas.setFont(font, self.title_font_size)
-        solution_canvas.drawString(title_x, title_y, title)  # Adjust the y-coordinate (750) as needed
-
-        for row_idx, row in enumerate(self.grid):
-            for col_idx, cell_value in enumerate(row):
-
-                # calculate the center of the cell
-                cell_center_x = grid_x + col_idx * self.cell_width + self.cell_width / 2
-                cell_center_y = grid_y + (self.rows - row_idx - 1) * self.cell_height + self.cell_height / 2
-
-
-                x = cell_center_x - solution_canvas.stringWidth(cell_value, font, self.font_size) / 2
-                y = cell_center_y - self.font_size / 2
-
-                solution_canvas.setFont(font, self.font_size)
+        solution_canvas.setFont(font, layout.title_font_size)
+        title_width = FONTS.string_width(title, font, layout.title_font_size)
+        solution_canvas.drawString(layout.title_x(title_width), layout.title_y, title)
+
+        solution_canvas.setFont(font, layout.font_size)
+        for row, centers in zip(self.grid, layout.cell_centers):
+            for cell_value, (cell_center_x, cell_center_y) in zip(row, centers):
+                x = cell_center_x - FONTS.string_width(cell_value, font, layout.font_size) / 2
+                y = cell_center_y - layout.font_size / 2
                 solution_canvas.drawString(x, y, cell_value)
 
-        # debug info: draw parameters
-        if self.debug:
-            print(f'Cell center x-coordinate: {cell_center_x}')
-            print(f'Cell center y-coordinate: {cell_center_y}')
-            print(f'Grid x-coordinate: {x}')
-            print(f'Grid y-coordinate: {y}')
-
-        # draw encapsulation lines and half-circles
-        #self.draw_encapsulation(solution_canvas, grid_x, grid_y)
-
         # Set border perameters
         solution_canvas.setStrokeColorRGB(0, 0, 0) # adjust for color
         solution_canvas.setLineWidth(2) # adjust for thingness
 
-        # calculate the starting coordinates for the boarder
-        border_x = grid_x - self.cell_width / 1.75
-        border_y = grid_y - self.cell_height / 1.75
-
-        # debug info: border start coordinates
-        if self.debug:
-            print(f'Border starting x-coordinate: {border_x}')
-            print(f'Border starting y-coordinate: {border_y}')
-
         # Draw a boarder around the grid
-        solution_canvas.rect(border_x, border_y, grid_width + self.cell_width, grid_height + self.cell_height, stroke = 1, fill = 0)
+        solution_canvas.rect(*layout.border, stroke = 1, fill = 0)
 
         ### END START handling the Grid and title ###
 
     # method to circle the answers int he solution grid
-    def draw_encapsulation(self, solution_canvas, grid_x, grid_y):
-        # set encapsulation parameters
-        '''encapsulation_color = (random.uniform(0.5, 1.0), random.uniform(0.5, 1.0), random.uniform(0.5, 1.0))
-        solution_canvas.setStrokeColorRGB(*encapsulation_color, alpha=1)
-        solution_canvas.setFillColorRGB(*encapsulation_color, alpha=1)
-        solution_canvas.setLineWidth(2)
-        '''
-        half_circle_radius = min(self.cell_width, self.cell_height) / 2.5
-        rotate_angle = 0
-        origin_x = 0
-        origin_y = 0
-
-         # calculate offsets for centering
-        vert_offset = self.cell_height / 6
-        hor_offset = self.cell_width / 6
+        # Every word becomes one capsule path (a bar with rounded ends) built directly in page
+        # coordinates. Capsules are grouped by color and each group is filled with a single
+        # path operator, so a page only changes color once per palette entry.
+    def draw_encapsulation(self, solution_canvas, layout):
+        from reportlab.pdfgen.canvas import FILL_NON_ZERO
+        radius = layout.highlight_radius
 
-        for word, start_row, start_col, end_row, end_col, direction in self.placement_info:
-            # set encapsulation parameters
-            encapsulation_color = (random.uniform(0.5, 1.0), random.uniform(0.5, 1.0), random.uniform(0.5, 1.0))
-            solution_canvas.setStrokeColorRGB(*encapsulation_color, alpha=1)
-            solution_canvas.setFillColorRGB(*encapsulation_color, alpha=1)
-            solution_canvas.setLineWidth(2)
-
-            # Setting the base coordinates
-            start_x = grid_x + self.cell_width * start_col + self.cell_width / 2
-            start_y = grid_y + self.cell_height * (self.rows - start_row - 1) + self.cell_height / 2
-            end_x = grid_x + self.cell_width * end_col + self.cell_width / 2
-            end_y = grid_y + self.cell_height * (self.rows - end_row - 1) + self.cell_height / 2
-
-            if direction in ["horizontal", "horizontal_backward"]:
-                # adjust start coordinates as needed
-                if direction == "horizontal_backward":
-                    start_x, end_x = end_x, start_x
-                    start_y, end_y = end_y, start_y
-
-                # draw half-circles at the ends
-                solution_canvas.circle(start_x, start_y - (vert_offset / 1.75), half_circle_radius, fill=1)
-                solution_canvas.circle(end_x, start_y - (vert_offset / 1.75), half_circle_radius, fill=1)
-
-                # draw rectangles to fill in the space
-                rect_width =  (end_x - start_x)
-                rect_height = half_circle_radius * 2 # (vert_offset * 2) - (vert_offset / 1.75)
-                rect_x = start_x #- half_circle_radius # / 2.5
-                rect_y = end_y - (vert_offset * 3)
-
-                solution_canvas.rect(rect_x, rect_y, rect_width, rect_height, fill=1)
-                
-            elif direction in ["vertical", "vertical_upward"]:
-                # adjust start coordinates as needed
-                if direction == "vertical_upward":
-                    start_y, end_y = end_y, start_y
-
-                # Draw half-circles at the ends
-                solution_canvas.circle(start_x, start_y - (vert_offset /2), half_circle_radius, fill=1)
-                solution_canvas.circle(start_x, end_y - (vert_offset /2), half_circle_radius, fill=1)
-
-                # Draw rectangles to fill in the space
-                rect_width = half_circle_radius * 2
-                rect_height = abs(end_y - start_y)
-                rect_x = start_x - (hor_offset * 2.45)
-                rect_y = min(start_y, end_y) - (vert_offset)
-
-                solution_canvas.rect(rect_x, rect_y, rect_width, rect_height, fill=1)
-
-            elif direction.startswith("diagonal"):
-                # adjust start coordinates as needed
-                # draw half-circles at the ends
-                solution_canvas.circle(start_x, start_y - (vert_offset / 1.5), half_circle_radius, fill=1)
-                solution_canvas.circle(end_x, end_y - (vert_offset / 1.5), half_circle_radius, fill=1)
-
-                # Calculate the center point between start and end coordinates
-                center_x = (start_x + end_x) / 2
-                center_y = (start_y + end_y) / 2
-
-                # Save current Canvas state to restore after rotate
-                solution_canvas.saveState()
-
-                # Translate to the center point for rotation
-                solution_canvas.translate(center_x, center_y)
-
-                if direction == "diagonal_tl_br":
-
-                    # Calculate the angle of the diagonal line
-                    angle_rad = math.atan2(end_y - start_y, end_x - start_x)
-                    angle_deg = math.degrees(angle_rad)
-
-                    # Rotate the canvas
-                    solution_canvas.rotate(angle_deg)
-
-                elif direction == "diagonal_tr_bl":
-                    # Calculate the angle of the diagonal line (adjust as needed)
-                    angle_rad = math.atan2(end_y - start_y, start_x - end_x)
-                    angle_deg = math.degrees(angle_rad)
-
-                    # Rotate the canvas
-                    solution_canvas.rotate(-angle_deg)
-
-                elif direction == "diagonal_bl_tr":
-                    # Calculate the angle of the diagonal line (adjust as needed)
-                    angle_rad = math.atan2(start_y - end_y, end_x - start_x)
-                    angle_deg = math.degrees(angle_rad)
-
-                    # Rotate the canvas
-                    solution_canvas.rotate(-angle_deg)
-
-                elif direction == "diagonal_br_tl":
-                    # Calculate the angle of the diagonal line (adjust as needed)
-                    angle_rad = math.atan2(start_y - end_y, start_x - end_x)
-                    angle_deg = math.degrees(angle_rad)
-
-                    # Rotate the canvas
-                    solution_canvas.rotate(angle_deg)
-
-                # Draw elements at the rotated angle (e.g., a rectangle)
-                rect_width = math.sqrt((end_x - start_x) ** 2 + (end_y - start_y) ** 2)
-                rect_height = half_circle_radius * 2
-                solution_canvas.rect(-rect_width / 2, -(rect_height / 2) - 1.5, rect_width, rect_height, fill=1)
-
-                if self.debug:
-                    print(f'Coordinates: {start_x}, {start_y}')
-                    print(f'Rotated: {center_x}, {center_y}')
-
-                # Reset the transformation
-                solution_canvas.restoreState()
+        # colors are drawn from the puzzle seed so a puzzle is always highlighted the same way
+        color_random = random.Random(self.seed)
 
-        # reset colors
-        solution_canvas.setStrokeColorRGB(0, 0, 0)  
-        solution_canvas.setFillColorRGB(0, 0, 0)  
-
-def main():
-    debug_enabled = True # set to True for debug functions to execute
-    
-    # default values
-    default_rows = 15
-    default_cols = 25
-    default_font_size = 'M'
-    default_title_size = 'L'
-    pdf_path = "/Users/HA/Desktop/Word Search/word_search_puzzles.pdf"
-    solution_pdf_path = "/Users/HA/Desktop/Word Search/word_search_solution.pdf"
-
-    pagesize = letter
-
-    generator = None
+        paths = {}
+        for word, start_row, start_col, end_row, end_col, direction in self.placement_info:
+            color = color_random.choice(HIGHLIGHT_COLORS)
+            if color not in paths:
+                paths[color] = solution_canvas.beginPath()
+            path = paths[color]
+
+            # centers of the first and last letter
+            start_x, start_y = layout.cell_centers[start_row][start_col]
+            end_x, end_y = layout.cell_centers[end_row][end_col]
+            start_y += layout.letter_center_dy
+            end_y += layout.letter_center_dy
+
+            # angle of the word and the side of the bar to the right of it
+            angle = math.degrees(math.atan2(end_y - start_y, end_x - start_x))
+            right_x = math.cos(math.radians(angle - 90)) * radius
+            right_y = math.sin(math.radians(angle - 90)) * radius
+
+            # counterclockwise: along the right side, around the end, back along the left side
+            # and around the start, so overlapping capsules of one color fill as a union
+            path.moveTo(start_x + right_x, start_y + right_y)
+            path.arcTo(end_x - radius, end_y - radius, end_x + radius, end_y + radius, angle - 90, 180)
+            path.arcTo(start_x - radius, start_y - radius, start_x + radius, start_y + radius, angle + 90, 180)
+            path.close()
+
+        for color, path in paths.items():
+            solution_canvas.setFillColorRGB(*color)
+            solution_canvas.drawPath(path, stroke=0, fill=1, fillMode=FILL_NON_ZERO)
 
-    # with open("input.txt", "r") as input_file:
-    with open("/Users/HA/Desktop/Word Search/Animal Kingdom.txt", "r") as input_file:
-        lines = input_file.readlines()
+        if self.debug:
+            print(f'Highlighted {len(self.placement_info)} words with {len(paths)} paths')
 
-    # initialize things
+        # reset colors
+        solution_canvas.setStrokeColorRGB(0, 0, 0)
+        solution_canvas.setFillColorRGB(0, 0, 0)
+
+# class: lays finished puzzles out N-up on solution pages
+    # Puzzles are added in book order and each grid is drawn exactly once into the next
+    # free slot; a page is closed as soon as its last slot is used. Grids too large for the
+    # page (see needs_poster) get a poster page of their own between the N-up pages.
+class SolutionCompositor:
+    def __init__(self, solution_canvas, solution_pdf_path, per_page=2, pagesize=LETTER):
+        if per_page not in NUP_ARRANGEMENTS:
+            raise ValueError(f"Solutions per page must be one of {sorted(NUP_ARRANGEMENTS)}")
+        self.canvas = solution_canvas
+        self.solution_pdf_path = solution_pdf_path
+        self.per_page = per_page
+        self.pagesize = pagesize
+        self.slot_index = 0
+
+    # function: draw a finished puzzle into the next free slot
+    def add(self, generator, title):
+        if generator.needs_poster():
+            self.finish()
+            self.canvas.setPageSize(generator.poster_pagesize())
+            generator.generate_solution_pdf(title, self.solution_pdf_path, self.canvas, "poster")
+            self.canvas.showPage()
+            return
+
+        if self.slot_index == 0:
+            self.canvas.setPageSize(self.pagesize)
+        generator.generate_solution_pdf(title, self.solution_pdf_path, self.canvas, (self.per_page, self.slot_index))
+        self.slot_index += 1
+        if self.slot_index == self.per_page:
+            self.canvas.showPage()
+            self.slot_index = 0
+
+    # function: close a page that still has free slots
+    def finish(self):
+        if self.slot_index:
+            self.canvas.showPage()
+            self.slot_index = 0
+
+
+# function: file name of one shard of a book: book.pdf -> book-0001.pdf
+def shard_path(path, index):
+    root, extension = os.path.splitext(path)
+    return f"{root}-{index:04d}{extension}"
+
+
+# class: the puzzle and solution books of a run, drawn page by page
+    # reportlab keeps every page of a canvas in memory until save(), so with shard_size set
+    # both books are split into shard files of shard_size puzzles that are saved as soon as
+    # they are full, which keeps memory flat however long the book is. shard_size is rounded
+    # up to a multiple of solutions_per_page so no solution page is split between shards.
+    # books: the books this writer draws, "puzzles" and/or "solutions"
+class BookWriter:
+    def __init__(self, pdf_path, solution_pdf_path, solutions_per_page=2, shard_size=None, pagesize=LETTER, books=("puzzles", "solutions")):
+        if shard_size is not None and shard_size < 1:
+            raise ValueError("Shard size must be at least 1")
+        self.pdf_path = pdf_path
+        self.solution_pdf_path = solution_pdf_path
+        self.solutions_per_page = solutions_per_page
+        self.shard_size = None if shard_size is None else -(-shard_size // solutions_per_page) * solutions_per_page
+        self.pagesize = pagesize
+        self.books = books
+        self.shards = []
+        self.puzzles_in_shard = 0
+        self._open()
+
+    # function: start the next pair of canvases (the whole books when not sharded)
+    def _open(self):
+        if self.shard_size is None:
+            paths = (self.pdf_path, self.solution_pdf_path)
+        else:
+            paths = (shard_path(self.pdf_path, len(self.shards) + 1), shard_path(self.solution_pdf_path, len(self.shards) + 1))
+        self.shards.append(paths)
+        self.paths = paths
+
+        # invariant canvases leave out timestamps and random document ids
+        if self.books:
+            from reportlab.pdfgen import canvas
+        if "puzzles" in self.books:
+            self.canvas = canvas.Canvas(paths[0], self.pagesize, invariant=1)
+        if "solutions" in self.books:
+            self.solution_canvas = canvas.Canvas(paths[1], self.pagesize, invariant=1)
+            self.compositor = SolutionCompositor(self.solution_canvas, paths[1], self.solutions_per_page, self.pagesize)
+        self.puzzles_in_shard = 0
+
+    # function: close the open pages and save the canvases
+    def _save(self):
+        if "puzzles" in self.books:
+            self.canvas.save()
+        if "solutions" in self.books:
+            self.compositor.finish()
+            self.solution_canvas.save()
+
+    # function: draw the puzzle page and the solution slot of a finished puzzle
+    def add(self, spec, generator):
+        if self.shard_size is not None and self.puzzles_in_shard == self.shard_size:
+            self._save()
+            self._open()
+        if "puzzles" in self.books:
+            generator.generate_pdf(spec.title, list(spec.words), self.paths[0], self.canvas)
+            self.canvas.showPage() # save the current page and start a new one
+        if "solutions" in self.books:
+            self.compositor.add(generator, spec.title)
+        self.puzzles_in_shard += 1
+
+    # function: drop the books of a failed build
+        # the open canvases are never saved; shards saved before the failure are deleted
+    def abort(self):
+        if self.shard_size is None:
+            return
+        for paths in self.shards[:-1]:
+            for book, path in zip(("puzzles", "solutions"), paths):
+                if book in self.books and os.path.exists(path):
+                    os.remove(path)
+
+    # function: save the last (or only) pair of files
+        # merge: join the shards into pdf_path and solution_pdf_path and delete them (needs pypdf)
+    def close(self, merge=False):
+        self._save()
+        if self.shard_size is not None and merge:
+            for book, merged_path in ((0, self.pdf_path), (1, self.solution_pdf_path)):
+                if ("puzzles", "solutions")[book] in self.books:
+                    merge_pdfs([paths[book] for paths in self.shards], merged_path)
+                    for paths in self.shards:
+                        os.remove(paths[book])
+
+
+# finished puzzles waiting for each renderer process in pipeline mode
+PIPELINE_QUEUE_SIZE = 8
+PIPELINE_POLL_INTERVAL = 1 # seconds a queue put waits before checking that its renderer is still alive
+
+
+# function: renderer process of the pipeline: draw one book from the (spec, generator) pairs of a queue
+    # None on the queue ends the book
+def render_book_worker(queue, book, pdf_path, solution_pdf_path, solutions_per_page, shard_size, merge_shards):
+    books = BookWriter(pdf_path, solution_pdf_path, solutions_per_page, shard_size, books=(book,))
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        books.add(*item)
+    books.close(merge_shards)
+
+
+# class: BookWriter front end that hands the drawing to one renderer process per book
+    # Generation (in this process or the worker pool) and the drawing of both books then run
+    # at the same time. Each renderer gets the puzzles in book order through a bounded queue,
+    # so the output is the same as BookWriter's and a slow renderer holds generation back
+    # instead of letting finished puzzles pile up.
+class PipelineBookWriter:
+    def __init__(self, pdf_path, solution_pdf_path, solutions_per_page=2, shard_size=None, merge_shards=False):
+        import multiprocessing
+        self.paths = (pdf_path, solution_pdf_path)
+        self.shard_size = shard_size
+        self.queues = []
+        self.renderers = []
+        for book in ("puzzles", "solutions"):
+            queue = multiprocessing.Queue(PIPELINE_QUEUE_SIZE)
+            renderer = multiprocessing.Process(target=render_book_worker,
+                                               args=(queue, book, pdf_path, solution_pdf_path, solutions_per_page, shard_size, merge_shards))
+            renderer.start()
+            self.queues.append(queue)
+            self.renderers.append(renderer)
+
+    # function: queue a finished puzzle for both renderers
+    def add(self, spec, generator):
+        for queue, renderer in zip(self.queues, self.renderers):
+            self._put(queue, renderer, (spec, generator))
+
+    # add/close helper function: put an item on a renderer queue, raise instead of blocking when the renderer died
+    def _put(self, queue, renderer, item):
+        from queue import Full
+        while True:
+            try:
+                queue.put(item, timeout=PIPELINE_POLL_INTERVAL)
+                return
+            except Full:
+                if not renderer.is_alive():
+                    self.abort()
+                    raise RuntimeError(f"Renderer process failed with exit code {renderer.exitcode}")
+
+    # function: end both books and wait for the renderers to save them
+        # (the renderers already know whether to merge shards)
+    def close(self, merge=False):
+        for queue, renderer in zip(self.queues, self.renderers):
+            self._put(queue, renderer, None)
+        for renderer in self.renderers:
+            renderer.join()
+            if renderer.exitcode != 0:
+                self.abort()
+                raise RuntimeError(f"Renderer process failed with exit code {renderer.exitcode}")
+
+    # function: stop both renderers without saving the books (the build failed)
+        # queued puzzles are dropped, so exiting does not wait for a reader that is gone; the
+        # renderers are stopped before they can clean up, so the shards they saved are deleted here
+    def abort(self):
+        for queue in self.queues:
+            queue.cancel_join_thread()
+        for renderer in self.renderers:
+            if renderer.is_alive():
+                renderer.terminate()
+            renderer.join()
+        if self.shard_size is not None:
+            for path in self.paths:
+                index = 1
+                while os.path.exists(shard_path(path, index)):
+                    os.remove(shard_path(path, index))
+                    index += 1
+
+
+# function: write an object read by pypdf as PDF syntax, with its references renumbered
+    # object_numbers maps (object number, generation) in the input to object numbers in the output,
+    # a page's /Parent points at parent_number, and stream data is copied still encoded
+def write_pdf_object(obj, merged_file, object_numbers, parent_number):
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+    if isinstance(obj, IndirectObject):
+        merged_file.write(b"%d 0 R" % object_numbers[obj.idnum, obj.generation])
+    elif isinstance(obj, DictionaryObject):
+        merged_file.write(b"<<")
+        for key, value in obj.items():
+            if key == "/Length" and isinstance(obj, StreamObject):
+                continue
+            merged_file.write(b"\n")
+            key.write_to_stream(merged_file)
+            merged_file.write(b" ")
+            if key == "/Parent":
+                merged_file.write(b"%d 0 R" % parent_number)
+            else:
+                write_pdf_object(value, merged_file, object_numbers, parent_number)
+        if isinstance(obj, StreamObject):
+            merged_file.write(b"\n/Length %d\n>>\nstream\n" % len(obj._data))
+            merged_file.write(obj._data)
+            merged_file.write(b"\nendstream")
+        else:
+            merged_file.write(b"\n>>")
+    elif isinstance(obj, ArrayObject):
+        merged_file.write(b"[")
+        for value in obj:
+            write_pdf_object(value, merged_file, object_numbers, parent_number)
+            merged_file.write(b" ")
+        merged_file.write(b"]")
+    else:
+        obj.write_to_stream(merged_file)
+
+
+# function: concatenate PDF files into one, streaming one input at a time
+    # The objects each page of an input needs are copied straight to the output and the input is
+    # dropped before the next one is read, so only the output offsets (8 bytes per object) and
+    # page numbers are kept and memory does not grow with the book. Object 1 is the catalog and
+    # object 2 the page tree, both written after the last input. Reads the inputs with pypdf.
+def merge_pdfs(paths, merged_path):
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    catalog_number, pages_number = 1, 2
+    offsets = array('Q', [0, 0, 0])
+    page_numbers = array('Q')
+    with open(merged_path, "wb") as merged_file:
+        merged_file.write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+        for path in paths:
+            reader = PdfReader(path)
+
+            # number the objects in the order they are found, pages first, and write them in that order
+            object_numbers = {}
+            pending = deque()
+
+            def number(reference):
+                key = (reference.idnum, reference.generation)
+                if key not in object_numbers:
+                    object_numbers[key] = len(offsets) + len(pending)
+                    pending.append(reference)
+                return object_numbers[key]
+
+            def find_references(value):
+                if isinstance(value, IndirectObject):
+                    number(value)
+                elif isinstance(value, DictionaryObject):
+                    for key, item in value.items():
+                        if key != "/Parent":
+                            find_references(item)
+                elif isinstance(value, ArrayObject):
+                    for item in value:
+                        find_references(item)
+
+            # pypdf copies inherited attributes (resources, media box) onto its page objects
+            for page in reader.pages:
+                page_numbers.append(number(page.indirect_reference))
+            while pending:
+                obj = pending[0].get_object()
+                find_references(obj)
+                pending.popleft()
+                offsets.append(merged_file.tell())
+                merged_file.write(b"%d 0 obj\n" % (len(offsets) - 1))
+                write_pdf_object(obj, merged_file, object_numbers, pages_number)
+                merged_file.write(b"\nendobj\n")
+            del reader
+
+        offsets[pages_number] = merged_file.tell()
+        merged_file.write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (pages_number, len(page_numbers)))
+        for page_number in page_numbers:
+            merged_file.write(b"%d 0 R " % page_number)
+        merged_file.write(b"] >>\nendobj\n")
+        offsets[catalog_number] = merged_file.tell()
+        merged_file.write(b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % (catalog_number, pages_number))
+
+        xref_offset = merged_file.tell()
+        merged_file.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(offsets))
+        for offset in offsets[1:]:
+            merged_file.write(b"%010d 00000 n \n" % offset)
+        merged_file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets), catalog_number, xref_offset))
+
+
+# default values
+DEFAULT_ROWS = 15
+DEFAULT_COLS = 25
+DEFAULT_FONT_SIZE = 'M'
+DEFAULT_TITLE_SIZE = 'L'
+DEFAULT_SOLVER = "backtracking" # "backtracking" or "constraint"
+DEFAULT_NODE_BUDGET = 200000 # max placements tried by the solver (None for no limit)
+DEFAULT_FILL = "unique" # "random" or "unique" (filler letters never spell an extra listed word)
+DEFAULT_OVERLAP = 1.0 # probability (0-1) of trying placements that cross placed words first
+DEFAULT_ASPECT = DEFAULT_COLS / DEFAULT_ROWS # cols per row of automatically sized grids
+
+# automatic grid sizing: each candidate size gets one quick placement attempt
+AUTO_SIZE_NODE_BUDGET = 2000
+AUTO_SIZE_MAX = 60 # largest rows (or cols) tried
+DEFAULT_RESTART_UNIT = 200 # the solver restarts after 200 * luby(n) placements (None: never)
+DEFAULT_PORTFOLIO = 1 # independently seeded attempts raced per puzzle (1: no portfolio)
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024 # bytes kept in a puzzle cache directory before the least recently used entries go
+
+# part of every puzzle cache key, bump it when a change alters the puzzles generated for a seed
+GENERATOR_VERSION = "1.2"
+
+# how puzzles are generated, shared by every puzzle of a run
+    # time_budget: wall clock seconds per puzzle on top of node_budget (None: no limit), only the
+    # service sets one, as it makes the puzzles generated for a seed depend on the machine's speed
+    # instrumented: time the generation phases for RunStats
+    # cache: PuzzleCache finished puzzles are loaded from and stored in (None: no cache)
+    # verify: look for listed words that are not found exactly once in the finished grid
+GenerationOptions = namedtuple(
+    "GenerationOptions",
+    ["solver", "node_budget", "time_budget", "fill", "overlap", "aspect", "restart_unit", "portfolio", "cache", "verify", "instrumented", "debug"],
+    defaults=[DEFAULT_SOLVER, DEFAULT_NODE_BUDGET, None, DEFAULT_FILL, DEFAULT_OVERLAP, DEFAULT_ASPECT, DEFAULT_RESTART_UNIT,
+              DEFAULT_PORTFOLIO, None, False, False, False]
+)
+
+# one puzzle block of an input file: settings in effect and the words listed under its title
+    # rows/cols are None when the grid size is searched automatically
+PuzzleSpec = namedtuple("PuzzleSpec", ["title", "rows", "cols", "font_size", "title_size", "words"])
+
+
+# function: value of a Rows:/Cols: line, None for "auto"
+def parse_grid_size(value):
+    value = value.strip()
+    if value.lower() == "auto":
+        return None
+    return int(value)
+
+
+# function: parse an input file into puzzle specs, one at a time
+    # Lines are read lazily, so a spec is yielded as soon as the next title closes it.
+    # Rows:/Cols:/Font Size: stay in effect for every following puzzle
+    # auto_size: rows/cols the file does not set are sized automatically instead of the defaults
+def iter_puzzle_specs(lines, auto_size=False):
     current_title = None
     current_word_list = []
     current_word_list_started = False
-    placement_info_list = []
-    current_rows = default_rows
-    current_cols = default_cols
-    current_font_size = default_font_size
-    current_title_size = default_title_size
-    c = canvas.Canvas(pdf_path, pagesize)
-    solution_canvas = canvas.Canvas(solution_pdf_path, pagesize)
-
-    grid_counter = 0  # Counter for tracking grids added on the current page
-    second_grid = False
+    current_rows = None if auto_size else DEFAULT_ROWS
+    current_cols = None if auto_size else DEFAULT_COLS
+    current_font_size = DEFAULT_FONT_SIZE
+    current_title_size = DEFAULT_TITLE_SIZE
 
     for line in lines:
         line = line.strip()
 
         if line.startswith("Rows:"):
-            current_rows = int(line.replace("Rows:", "").strip())
+            current_rows = parse_grid_size(line.replace("Rows:", ""))
         elif line.startswith("Cols:"):
-            current_cols = int(line.replace("Cols:", "").strip())
+            current_cols = parse_grid_size(line.replace("Cols:", ""))
         elif line.startswith("Font Size:"):
             current_font_size = line.replace("Font Size:", "").strip()
         elif line.startswith("Title:"):
             if current_title and current_word_list:
-                generator = WordFindPuzzleGenerator(current_rows, current_cols, current_word_list, current_font_size, current_title_size, debug=debug_enabled)
-                generator.set_font_size(current_font_size, current_title_size)
-                generator.grid_all_word_validation()
-                generator.generate_puzzle(current_word_list)
-
-                # store the placement infor for each word
-                # used to properly encapsulate the data in the solution grid
-                for word, start_row, start_col, end_row, end_col, direction in generator.placement_info:
-                        placement_info_list.append((word, start_row, start_col, end_row, end_col, direction))
-
-                generator.generate_pdf(current_title, current_word_list, pdf_path, c)
-
-                grid_counter += 1
-
-                generator.generate_solution_pdf(current_title, solution_pdf_path, solution_canvas, second_grid)
-                second_grid = True
-
-                if grid_counter == 2:
-                    generator.generate_solution_pdf(current_title, solution_pdf_path, solution_canvas, second_grid)
-                    solution_canvas.showPage()
-                    grid_counter = 0 # resets counter for next solution page
-                    second_grid = False
-
-                c.showPage() # save the current page and start a new one
+                yield PuzzleSpec(current_title, current_rows, current_cols, current_font_size, current_title_size, tuple(current_word_list))
             current_title = line.replace("Title:", "").strip()
             current_word_list = []
         elif line == "Word List:":
             current_word_list_started = True
-        elif current_word_list_started:
+        elif current_word_list_started and line:
             current_word_list.append(line)
 
-    # Process the last puzzle
-    if generator and current_title and current_word_list:
-        generator = WordFindPuzzleGenerator(current_rows, current_cols, current_word_list, current_font_size, current_title_size, debug=debug_enabled)
-        generator.set_font_size(current_font_size, current_title_size)
-        generator.grid_all_word_validation()
-        generator.generate_puzzle(current_word_list)
-         # store the placement infor for each word
-        # used to properly encapsulate the data in the solution grid
-        for word, start_row, start_col, end_row, end_col, direction in generator.placement_info:
-                placement_info_list.append((word, start_row, start_col, end_row, end_col, direction))
-        generator.generate_pdf(current_title, current_word_list, pdf_path, c)
-        generator.generate_solution_pdf(current_title, solution_pdf_path, solution_canvas, second_grid)
-        c.showPage() # save the current page and start a new one
-        solution_canvas.showPage()
+    # the last puzzle has no following title to close it
+    if current_title and current_word_list:
+        yield PuzzleSpec(current_title, current_rows, current_cols, current_font_size, current_title_size, tuple(current_word_list))
+
+
+# function: deterministic seed for one puzzle, derived from the run seed and the puzzle content
+    # the same puzzle gets the same seed wherever it sits in the file and whichever worker runs it
+def derive_seed(seed, spec):
+    digest = hashlib.sha256(repr((seed, tuple(spec))).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+# function: the generation options that change the puzzles generated for a seed
+def generation_settings(options):
+    return [options.solver, options.node_budget, options.time_budget, options.fill, options.overlap,
+            options.aspect, options.restart_unit, options.portfolio]
+
+
+# class: on-disk store of finished puzzles, keyed by a hash of everything that decides the grid
+    # Entries are JSON files under directory/<first two key characters>/. A writer fills a
+    # temporary file in the same directory and renames it over the entry, so concurrent runs
+    # sharing the directory only ever see whole entries. Reading an entry touches it, and
+    # evict() drops the least recently used entries once the directory holds more than max_size bytes.
+class PuzzleCache:
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    # function: cache key of a puzzle: normalized word list, geometry, directions, seed, options and generator version
+    def key(self, spec, seed, options):
+        words = [word.strip().upper() for word in spec.words]
+        content = [GENERATOR_VERSION, words, spec.rows, spec.cols, DIRECTIONS, seed, generation_settings(options)]
+        return hashlib.sha256(json.dumps(content).encode("utf-8")).hexdigest()
+
+    # function: file of an entry
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    # function: stored entry of a key, None when missing or unreadable
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "r") as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    # function: store the entry of a finished puzzle
+    def store(self, key, generator):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        import tempfile
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w") as entry_file:
+                json.dump(generator.cache_entry(), entry_file)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    # function: delete least recently used entries until the cache fits max_size
+        # entries another run deletes at the same time are skipped
+    def evict(self):
+        entries = []
+        for folder, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                if not file_name.endswith(".json"):
+                    continue
+                path = os.path.join(folder, file_name)
+                try:
+                    status = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+
+# function: load a puzzle from options.cache, or generate (and store) it
+    # runs in a worker process when jobs > 1, in the main process for portfolio runs
+def cached_puzzle_job(spec, seed, options=GenerationOptions(), executor=None, best_attempt=None):
+    if options.cache is not None:
+        key = options.cache.key(spec, seed, options)
+        entry = options.cache.load(key)
+        if entry is not None:
+            generator = WordFindPuzzleGenerator(entry["rows"], entry["cols"], list(spec.words), spec.font_size, spec.title_size, debug=options.debug, seed=entry["seed"])
+            generator.set_font_size(spec.font_size, spec.title_size)
+            generator.load_cache_entry(entry)
+            if options.verify:
+                generator.verify_occurrences()
+            return generator
+
+    if options.portfolio > 1:
+        generator = generate_portfolio(spec, seed, options, executor, best_attempt)
+    else:
+        generator = generate_puzzle_job(spec, seed, options)
+
+    # a search cut short by the clock would not give the same puzzle again
+    if options.cache is not None and not generator.timed_out:
+        options.cache.store(key, generator)
+    return generator
+
+
+# function: True when one quick placement attempt fits every word into a rows x cols grid
+def quick_fit(rows, cols, words, seed):
+    if grid_size_problem(rows, cols, words):
+        return False
+    generator = WordFindPuzzleGenerator(rows, cols, list(words), DEFAULT_FONT_SIZE, DEFAULT_TITLE_SIZE, debug=False, seed=seed)
+    generator.fill_grid()
+    return generator.backtracking_word_placement(AUTO_SIZE_NODE_BUDGET, overlap=1.0)
+
+
+# function: smallest grid found to hold a word list, as (rows, cols)
+    # rows/cols: a fixed side, or None to search it; with both None cols follow rows at the
+    # aspect ratio. The cheap checks of grid_size_problem give the smallest candidate, then
+    # the step grows (1, 2, 4, ...) until a quick placement attempt fits and a binary search
+    # narrows the gap to the last failed size.
+def find_grid_size(words, rows=None, cols=None, aspect=DEFAULT_ASPECT, seed=None):
+    def size(scale):
+        if rows is None and cols is None:
+            return scale, max(1, math.ceil(scale * aspect))
+        if rows is None:
+            return scale, cols
+        return rows, scale
+
+    if rows is not None and cols is not None:
+        return rows, cols
+
+    lower = 1
+    while lower < AUTO_SIZE_MAX and grid_size_problem(*size(lower), words):
+        lower += 1
+
+    failed = lower - 1
+    step = 1
+    upper = lower
+    while upper < AUTO_SIZE_MAX and not quick_fit(*size(upper), words, seed):
+        failed = upper
+        upper = min(upper + step, AUTO_SIZE_MAX)
+        step *= 2
+
+    while upper - failed > 1:
+        middle = (failed + upper) // 2
+        if quick_fit(*size(middle), words, seed):
+            upper = middle
+        else:
+            failed = middle
+    return size(upper)
+
+
+# function: place the words of one puzzle spec (runs in a worker process when jobs > 1)
+    # attempt: portfolio attempt number, attempt 0 uses the puzzle seed itself
+def generate_puzzle_job(spec, seed, options=GenerationOptions(), attempt=0):
+    if spec.rows is None or spec.cols is None:
+        rows, cols = find_grid_size(spec.words, spec.rows, spec.cols, options.aspect, seed)
+        spec = spec._replace(rows=rows, cols=cols)
+    word_list = list(spec.words)
+    generator = WordFindPuzzleGenerator(spec.rows, spec.cols, word_list, spec.font_size, spec.title_size, debug=options.debug, seed=attempt_seed(seed, attempt))
+    generator.instrumented = options.instrumented
+    generator.attempt = attempt
+    if _portfolio_best is not None:
+        generator.cancel_check = portfolio_cancelled
+    generator.set_font_size(spec.font_size, spec.title_size)
+    generator.grid_all_word_validation()
+    generator.generate_puzzle(word_list, options.solver, options.node_budget, options.time_budget, options.fill, options.overlap, options.restart_unit)
+    generator.cancel_check = None
+    if options.verify:
+        generator.verify_occurrences()
+    return generator
+
+
+# function: seed of one portfolio attempt of a puzzle
+def attempt_seed(seed, attempt):
+    if attempt == 0:
+        return seed
+    digest = hashlib.sha256(repr((seed, attempt)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+# portfolio attempts share the lowest attempt found to complete its placement so far
+_portfolio_best = None
+PORTFOLIO_UNSOLVED = 2 ** 62
+
+
+# function: worker initializer of the portfolio pool (None leaves portfolio mode)
+def init_portfolio_worker(best_attempt):
+    global _portfolio_best
+    _portfolio_best = best_attempt
+
+
+# function: True once a lower attempt than this one has completed its placement
+def portfolio_cancelled(attempt):
+    return _portfolio_best.value < attempt
+
+
+# function: winning generator of a portfolio: the lowest attempt that completed its placement,
+    # else the one that placed the most words (lowest attempt on ties)
+def portfolio_winner(generators):
+    generators = sorted(generators, key=lambda generator: generator.attempt)
+    for generator in generators:
+        if not generator.words_not_placed:
+            return generator
+    return max(generators, key=lambda generator: len(generator.placed_words))
+
+
+# function: race options.portfolio independently seeded attempts at one puzzle
+    # The lowest attempt to complete wins, so the winner does not depend on the number of
+    # workers or their timing. As soon as an attempt completes, the attempts above it can no
+    # longer win: the queued ones are cancelled before they start and the running ones stop
+    # at their next node, while the attempts below it run on. Without an executor the attempts
+    # run one after another until one completes.
+def generate_portfolio(spec, seed, options, executor=None, best_attempt=None):
+    from concurrent.futures import as_completed
+    if executor is None:
+        generators = []
+        for attempt in range(options.portfolio):
+            generators.append(generate_puzzle_job(spec, seed, options, attempt))
+            if not generators[-1].words_not_placed:
+                break
+        return portfolio_winner(generators)
+
+    best_attempt.value = PORTFOLIO_UNSOLVED
+    futures = [executor.submit(generate_puzzle_job, spec, seed, options, attempt) for attempt in range(options.portfolio)]
+    generators = []
+    for future in as_completed(futures):
+        if future.cancelled():
+            continue
+        generator = future.result()
+        generators.append(generator)
+        if not generator.words_not_placed and generator.attempt < best_attempt.value:
+            best_attempt.value = generator.attempt
+            for later in futures[generator.attempt + 1:]:
+                later.cancel()
+    return portfolio_winner(generators)
+
+
+# function: generate puzzles in spec order, yielding (spec, generator) pairs as they finish
+    # with jobs > 1 at most 2 * jobs puzzles are in flight, so memory stays bounded
+    # however many specs the input holds
+    # with options.portfolio > 1 puzzles are generated one at a time and the workers race
+    # the attempts of each puzzle instead
+def iter_generated_puzzles(specs, jobs=1, seed=None, options=GenerationOptions()):
+    if options.portfolio > 1 and jobs > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        best_attempt = multiprocessing.RawValue('q', PORTFOLIO_UNSOLVED)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_portfolio_worker, initargs=(best_attempt,)) as executor:
+            for spec in specs:
+                yield spec, cached_puzzle_job(spec, derive_seed(seed, spec), options, executor, best_attempt)
+        return
+
+    if jobs <= 1:
+        for spec in specs:
+            yield spec, cached_puzzle_job(spec, derive_seed(seed, spec), options)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for spec in specs:
+            pending.append((spec, executor.submit(cached_puzzle_job, spec, derive_seed(seed, spec), options)))
+            if len(pending) >= 2 * jobs:
+                spec, future = pending.popleft()
+                yield spec, future.result()
+        while pending:
+            spec, future = pending.popleft()
+            yield spec, future.result()
+
+
+# class: per puzzle counters and timings of one run, exported as JSON or CSV
+    # Generators only measure their phases when instrumented is set, so a run without
+    # a stats file pays nothing for the timers.
+class RunStats:
+    FIELDS = ["title", "rows", "cols", "words", "words_not_placed", "ambiguous_words", "nodes_visited", "backtracks",
+              "restarts", "attempt", "cached", "can_place_calls", "position_scans", "fill_conflicts", "placement_time", "fill_time", "render_time"]
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.puzzles = []
+
+    # function: record a finished (generated and rendered) puzzle
+    def add(self, title, generator):
+        self.puzzles.append({
+            "title": title.replace('"', ''),
+            "rows": generator.rows,
+            "cols": generator.cols,
+            "words": len(generator.placed_words) + len(generator.words_not_placed),
+            "words_not_placed": len(generator.words_not_placed),
+            "ambiguous_words": len(generator.ambiguous_words or {}),
+            "nodes_visited": generator.nodes_visited,
+            "backtracks": generator.backtracks,
+            "restarts": generator.restarts,
+            "attempt": generator.attempt,
+            "cached": int(generator.cached),
+            "can_place_calls": generator.can_place_calls,
+            "position_scans": generator.position_scans,
+            "fill_conflicts": generator.fill_conflicts,
+            "placement_time": generator.timings.get("placement", 0.0),
+            "fill_time": generator.timings.get("fill", 0.0),
+            "render_time": generator.timings.get("render", 0.0)
+        })
+
+    # function: totals over every recorded puzzle
+    def summary(self):
+        totals = {field: sum(puzzle[field] for puzzle in self.puzzles) for field in self.FIELDS[3:]}
+        totals["puzzles"] = len(self.puzzles)
+        totals["wall_time"] = time.perf_counter() - self.started
+        return totals
+
+    # function: write the run summary, as CSV when the path ends with .csv and JSON otherwise
+    def write(self, path):
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as stats_file:
+                writer = csv.DictWriter(stats_file, fieldnames=self.FIELDS)
+                writer.writeheader()
+                writer.writerows(self.puzzles)
+        else:
+            with open(path, "w") as stats_file:
+                json.dump({"summary": self.summary(), "puzzles": self.puzzles}, stats_file, indent=2)
+
+
+# placement of one word: cells of its first and last letter and the direction read from the first
+Placement = namedtuple("Placement", ["word", "start_row", "start_col", "end_row", "end_col", "direction"])
+
+# a finished puzzle as plain data, everything needed to render it again
+    # grid holds one string of letters per row, words the listed words in input order and
+    # placements the words hidden in the grid; font_size/title_size are the size names of the input
+Puzzle = namedtuple("Puzzle", ["title", "rows", "cols", "font_size", "title_size", "seed", "grid", "words", "placements"])
+
+
+# function: Puzzle of a finished generator and the spec it was generated from
+def puzzle_from_generator(spec, generator):
+    return Puzzle(
+        title=spec.title.replace('"', ''),
+        rows=generator.rows,
+        cols=generator.cols,
+        font_size=spec.font_size,
+        title_size=spec.title_size,
+        seed=generator.seed,
+        grid=tuple("".join(row) for row in generator.grid),
+        words=tuple(spec.words),
+        placements=tuple(Placement(*info) for info in generator.placement_info)
+    )
+
+
+# function: generator holding a Puzzle, ready to draw its pages (spec of the puzzle: puzzle_spec)
+def generator_from_puzzle(puzzle, debug=False):
+    generator = WordFindPuzzleGenerator(puzzle.rows, puzzle.cols, list(puzzle.words), puzzle.font_size, puzzle.title_size, debug=debug, seed=puzzle.seed)
+    generator.set_font_size(puzzle.font_size, puzzle.title_size)
+    for row, letters in enumerate(puzzle.grid):
+        for col, letter in enumerate(letters):
+            generator.state.set_letter(row, col, letter)
+    generator.placement_info = [tuple(placement) for placement in puzzle.placements]
+
+    # sort the listed words into placed / not placed, a word listed twice can be placed once
+    hidden = [placement.word for placement in puzzle.placements]
+    generator.placed_words = []
+    generator.words_not_placed = []
+    generator.remaining_words = []
+    for original_word in puzzle.words:
+        word = original_word.replace(" ", "")
+        if word.upper() in hidden:
+            hidden.remove(word.upper())
+            generator.placed_words.append(word)
+        elif word.strip():
+            generator.words_not_placed.append(word)
+            generator.remaining_words.append(original_word)
+    return generator
+
+
+# function: PuzzleSpec a Puzzle is drawn with
+def puzzle_spec(puzzle):
+    return PuzzleSpec(puzzle.title, puzzle.rows, puzzle.cols, puzzle.font_size, puzzle.title_size, puzzle.words)
+
+
+# function: Puzzle as a JSON-serializable dict (placements as dicts with named fields)
+def puzzle_to_dict(puzzle):
+    return dict(puzzle._asdict(), grid=list(puzzle.grid), words=list(puzzle.words), placements=[placement._asdict() for placement in puzzle.placements])
+
+
+# function: Puzzle from a dict written by puzzle_to_dict
+def puzzle_from_dict(data):
+    return Puzzle(**dict(data, grid=tuple(data["grid"]), words=tuple(data["words"]), placements=tuple(Placement(**placement) for placement in data["placements"])))
+
+
+# function: Puzzle as plain text: the title, the grid with its letters spaced out and the sorted word list
+def puzzle_text(puzzle):
+    lines = [puzzle.title, ""]
+    lines.extend(" ".join(row) for row in puzzle.grid)
+    lines.append("")
+    lines.extend(sorted(word for word in puzzle.words if word.strip()))
+    return "\n".join(lines) + "\n"
+
+
+# packed puzzle archive (.wfa): the magic, one record per puzzle, the record offsets and a trailer,
+    # all little-endian. A record is ARCHIVE_RECORD, the title, font size names and listed words as
+    # length-prefixed UTF-8, the grid letters (one Latin-1 byte per cell, or four bytes UTF-32 when
+    # a letter does not fit a byte) and one ARCHIVE_PLACEMENT per placed word, whose word is given
+    # by the index of the listed word. The trailer points at the offsets, so any puzzle is read
+    # with two seeks however many the archive holds.
+ARCHIVE_MAGIC = b"WFA1"
+ARCHIVE_SUFFIX = ".wfa"
+ARCHIVE_RECORD = struct.Struct("<HHBBQHH") # rows, cols, bytes per cell, has seed, seed, listed words, placements
+ARCHIVE_PLACEMENT = struct.Struct("<HHHHHB") # listed word index, start row, start col, end row, end col, direction index
+ARCHIVE_TEXT = struct.Struct("<H") # byte length of a text field
+ARCHIVE_OFFSET = struct.Struct("<Q")
+ARCHIVE_TRAILER = struct.Struct("<QI4s") # offset of the record offsets, puzzle count, magic
+
+
+# function: one archive record of a Puzzle
+def pack_puzzle(puzzle):
+    letters = "".join(puzzle.grid)
+    if len(letters) != puzzle.rows * puzzle.cols:
+        raise ValueError(f"Puzzle {puzzle.title} does not have one letter per grid cell")
+    try:
+        cells = letters.encode("latin-1")
+    except UnicodeEncodeError:
+        cells = letters.encode("utf-32-le")
+    cell_size = len(cells) // len(letters) if letters else 1
+
+    # placed words are stored as the index of the (first) listed word they come from
+    word_indexes = {}
+    for index, word in enumerate(puzzle.words):
+        word_indexes.setdefault(word.replace(" ", "").upper(), index)
+
+    parts = [ARCHIVE_RECORD.pack(puzzle.rows, puzzle.cols, cell_size, puzzle.seed is not None, puzzle.seed or 0, len(puzzle.words), len(puzzle.placements))]
+    for text in (puzzle.title, puzzle.font_size, puzzle.title_size) + tuple(puzzle.words):
+        encoded = text.encode("utf-8")
+        parts.append(ARCHIVE_TEXT.pack(len(encoded)))
+        parts.append(encoded)
+    parts.append(cells)
+    for word, start_row, start_col, end_row, end_col, direction in puzzle.placements:
+        if word not in word_indexes:
+            raise ValueError(f"Placed word {word} of {puzzle.title} is not listed")
+        parts.append(ARCHIVE_PLACEMENT.pack(word_indexes[word], start_row, start_col, end_row, end_col, DIRECTIONS.index(direction)))
+    return b"".join(parts)
+
+
+# function: Puzzle of an archive record written by pack_puzzle
+def unpack_puzzle(record):
+    rows, cols, cell_size, has_seed, seed, word_count, placement_count = ARCHIVE_RECORD.unpack_from(record)
+    offset = ARCHIVE_RECORD.size
+
+    texts = []
+    for _ in range(3 + word_count):
+        (length,) = ARCHIVE_TEXT.unpack_from(record, offset)
+        offset += ARCHIVE_TEXT.size
+        texts.append(bytes(record[offset:offset + length]).decode("utf-8"))
+        offset += length
+    title, font_size, title_size = texts[:3]
+    words = tuple(texts[3:])
+
+    cells = bytes(record[offset:offset + rows * cols * cell_size])
+    letters = cells.decode("latin-1" if cell_size == 1 else "utf-32-le")
+    offset += len(cells)
+
+    placements = []
+    for word_index, start_row, start_col, end_row, end_col, direction in ARCHIVE_PLACEMENT.iter_unpack(record[offset:offset + placement_count * ARCHIVE_PLACEMENT.size]):
+        placements.append(Placement(words[word_index].replace(" ", "").upper(), start_row, start_col, end_row, end_col, DIRECTIONS[direction]))
+
+    return Puzzle(
+        title=title,
+        rows=rows,
+        cols=cols,
+        font_size=font_size,
+        title_size=title_size,
+        seed=seed if has_seed else None,
+        grid=tuple(letters[row * cols:(row + 1) * cols] for row in range(rows)),
+        words=words,
+        placements=tuple(placements)
+    )
+
+
+# class: writes Puzzles to a packed archive one record at a time
+    # only the record offsets (8 bytes per puzzle) are kept until close() writes them with the trailer
+class PuzzleArchiveWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(ARCHIVE_MAGIC)
+        self.offsets = array('Q')
+
+    # function: append a puzzle to the archive
+    def add(self, puzzle):
+        self.offsets.append(self.file.tell())
+        self.file.write(pack_puzzle(puzzle))
+
+    # function: write the record offsets and the trailer and close the file
+    def close(self):
+        index_offset = self.file.tell()
+        offsets = array('Q', self.offsets)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.write(ARCHIVE_TRAILER.pack(index_offset, len(self.offsets), ARCHIVE_MAGIC))
+        self.file.close()
+
+
+# class: random access to the Puzzles of a packed archive by index
+    # nothing is read up front but the trailer; archive[index] reads one offset pair and one record
+class PuzzleArchive:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.file.seek(0, os.SEEK_END)
+        size = self.file.tell()
+        if size < len(ARCHIVE_MAGIC) + ARCHIVE_TRAILER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a puzzle archive")
+        self.file.seek(size - ARCHIVE_TRAILER.size)
+        self.index_offset, self.count, magic = ARCHIVE_TRAILER.unpack(self.file.read(ARCHIVE_TRAILER.size))
+        self.file.seek(0)
+        if magic != ARCHIVE_MAGIC or self.file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a puzzle archive")
+
+    def __len__(self):
+        return self.count
+
+    # function: Puzzle at an index (negative indexes count from the end)
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"Puzzle index {index} out of range for {self.count} puzzles")
+
+        # the record ends where the next one starts, the last one where the offsets start
+        self.file.seek(self.index_offset + index * ARCHIVE_OFFSET.size)
+        offsets = self.file.read(ARCHIVE_OFFSET.size * 2 if index + 1 < self.count else ARCHIVE_OFFSET.size)
+        start = ARCHIVE_OFFSET.unpack_from(offsets)[0]
+        end = ARCHIVE_OFFSET.unpack_from(offsets, ARCHIVE_OFFSET.size)[0] if index + 1 < self.count else self.index_offset
+        self.file.seek(start)
+        return unpack_puzzle(self.file.read(end - start))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.file.close()
+
+
+# class: the outputs of a run that need no PDF rendering, every finished Puzzle goes to each open one
+    # json_path: one JSON line per puzzle (puzzle_to_dict), archive_path: packed archive
+    # (PuzzleArchiveWriter), text_path: puzzle_text blocks; None leaves an output out
+class PuzzleExport:
+    def __init__(self, json_path=None, archive_path=None, text_path=None):
+        self.json_file = open(json_path, "w") if json_path else None
+        self.archive = PuzzleArchiveWriter(archive_path) if archive_path else None
+        self.text_file = open(text_path, "w", encoding="utf-8") if text_path else None
+        self.active = any(output is not None for output in (self.json_file, self.archive, self.text_file))
+
+    # function: write a puzzle to every open output
+    def add(self, puzzle):
+        if self.json_file is not None:
+            self.json_file.write(json.dumps(puzzle_to_dict(puzzle)) + "\n")
+        if self.archive is not None:
+            self.archive.add(puzzle)
+        if self.text_file is not None:
+            self.text_file.write(puzzle_text(puzzle) + "\n")
+
+    # function: close every open output
+    def close(self):
+        if self.json_file is not None:
+            self.json_file.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.text_file is not None:
+            self.text_file.close()
+
+
+# function: generate all puzzles of an input file and draw the puzzle and solution books
+    # with a seed the output is byte-identical whatever the number of jobs
+    # stats_path: write per puzzle counters and timings to this JSON (or .csv) file
+    # auto_size: search the grid size of every puzzle whose Rows:/Cols: the input does not set
+    # shard_size: write the books as shard files of this many puzzles (see BookWriter)
+    # merge_shards: join the shards into the two books at the end
+    # pipeline: draw the books in renderer processes while puzzles are generated
+    # (render_time is then not measured for the stats)
+    # json_path / archive_path / text_path: also write every finished Puzzle to these files (see PuzzleExport)
+    # pdf_path / solution_pdf_path None: no PDF books, nothing of reportlab is loaded
+    # returns the number of puzzles built
+def build_books(input_path, pdf_path, solution_pdf_path, jobs=1, seed=None, options=GenerationOptions(), solutions_per_page=2, stats_path=None, auto_size=False,
+                shard_size=None, merge_shards=False, pipeline=False, json_path=None, archive_path=None, text_path=None):
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if options.debug:
+        print(f'Seed: {seed}')
+
+    if pdf_path is None:
+        books = BookWriter(None, None, solutions_per_page, books=())
+    elif pipeline:
+        books = PipelineBookWriter(pdf_path, solution_pdf_path, solutions_per_page, shard_size, merge_shards)
+    else:
+        books = BookWriter(pdf_path, solution_pdf_path, solutions_per_page, shard_size)
+    export = PuzzleExport(json_path, archive_path, text_path)
+    puzzles = 0
+
+    stats = RunStats() if stats_path else None
+    if stats is not None:
+        options = options._replace(instrumented=True)
+
+    try:
+        with open(input_path, "r") as input_file:
+            for spec, generator in iter_generated_puzzles(iter_puzzle_specs(input_file, auto_size), jobs, seed, options):
+                warn_ambiguous(spec, generator)
+
+                if stats is not None:
+                    render_start = time.perf_counter()
+
+                books.add(spec, generator)
+                if export.active:
+                    export.add(puzzle_from_generator(spec, generator))
+                puzzles += 1
+
+                if stats is not None:
+                    if not pipeline:
+                        generator.timings["render"] = time.perf_counter() - render_start
+                    stats.add(spec.title, generator)
+    except BaseException:
+        # a failed build must not leave renderer processes waiting for the end of the books
+        books.abort()
+        export.close()
+        raise
 
     # Save the final pdf
+    books.close(merge_shards)
+    export.close()
+
+    if stats is not None:
+        stats.write(stats_path)
+
+    if options.cache is not None:
+        options.cache.evict()
+
+    return puzzles
+
+
+# function: draw the books of the puzzles of a packed archive, without generating anything
+    # indexes: archive indexes of the puzzles to draw, in this order (None: all of them)
+    # json_path / text_path: also write the drawn Puzzles to these files (see PuzzleExport)
+    # returns the number of puzzles drawn
+def render_archive(archive_path, pdf_path, solution_pdf_path, indexes=None, solutions_per_page=2, shard_size=None, merge_shards=False, json_path=None, text_path=None):
+    archive = PuzzleArchive(archive_path)
+    if pdf_path is None:
+        books = BookWriter(None, None, solutions_per_page, books=())
+    else:
+        books = BookWriter(pdf_path, solution_pdf_path, solutions_per_page, shard_size)
+    export = PuzzleExport(json_path, text_path=text_path)
+    puzzles = 0
+
+    try:
+        for index in range(len(archive)) if indexes is None else indexes:
+            puzzle = archive[index]
+            books.add(puzzle_spec(puzzle), generator_from_puzzle(puzzle))
+            export.add(puzzle)
+            puzzles += 1
+    finally:
+        archive.close()
+        export.close()
+    books.close(merge_shards)
+    return puzzles
+
+
+# function: print the listed words of a puzzle that verify found a different number of times than once
+def warn_ambiguous(spec, generator):
+    if generator.ambiguous_words:
+        found = ", ".join(f"{word} ({count}x)" for word, count in generator.ambiguous_words.items())
+        print(f"Warning: {spec.title} has words not found exactly once: {found}")
+
+
+# manifest of an incremental build, kept next to the puzzle book
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+# function: hash of one puzzle block of the input
+def spec_hash(spec):
+    return hashlib.sha256(json.dumps(list(spec)).encode("utf-8")).hexdigest()
+
+
+# function: hash of the settings every page of a book depends on
+def book_settings(seed, options, solutions_per_page):
+    content = [GENERATOR_VERSION, seed, generation_settings(options), solutions_per_page]
+    return hashlib.sha256(json.dumps(content).encode("utf-8")).hexdigest()
+
+
+# function: write a spliced PDF through a temporary file so an interrupted build leaves the old book in place
+    # objects the old and new pages both carry (fonts, shared resources) are stored once
+def replace_pdf(writer, path):
+    writer.compress_identical_objects()
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as pdf_file:
+        writer.write(pdf_file)
+    os.replace(temp_path, path)
+
+
+# function: whether a solution book lays its puzzles out other than one solution page per group
+    # poster puzzles take a page of their own, so with several solutions per page the groups no
+    # longer map onto pages; their pages are the ones larger than a letter page
+def has_poster_pages(solution_pdf_path, solutions_per_page):
+    from pypdf import PdfReader
+
+    if solutions_per_page == 1:
+        return False
+    reader = PdfReader(solution_pdf_path)
+    return any((float(page.mediabox.width), float(page.mediabox.height)) != LETTER for page in reader.pages)
+
+
+# function: rebuild the books, re-rendering only the pages whose puzzles changed since the last build
+    # The manifest next to pdf_path keeps the run seed, a hash of the book settings, the spec
+    # hash of every puzzle page and the spec hashes on every solution page. A page whose hashes
+    # are found in the manifest is copied from the existing PDF (wherever it was), so edits,
+    # insertions and reordering only regenerate the new puzzles and the puzzles sharing a
+    # solution page with them. Without a usable manifest (first build, other settings or
+    # missing PDFs) the books are built in full, as are books whose solutions include poster
+    # pages sharing the solution book with other puzzles. The run seed comes from the manifest
+    # when none is given. Splicing needs pypdf. Returns the number of puzzles in the books.
+def rebuild_books(input_path, pdf_path, solution_pdf_path, jobs=1, seed=None, options=GenerationOptions(), solutions_per_page=2, stats_path=None, auto_size=False):
+    from pypdf import PdfReader, PdfWriter
+    from reportlab.pdfgen import canvas
+
+    manifest_path = pdf_path + MANIFEST_SUFFIX
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+    if seed is None:
+        seed = manifest["seed"] if manifest is not None else random.randrange(2 ** 32)
+
+    with open(input_path, "r") as input_file:
+        specs = list(iter_puzzle_specs(input_file, auto_size))
+    puzzle_hashes = [spec_hash(spec) for spec in specs]
+    solution_pages = [puzzle_hashes[start:start + solutions_per_page] for start in range(0, len(specs), solutions_per_page)]
+    settings = book_settings(seed, options, solutions_per_page)
+
+    usable = manifest is not None and manifest["settings"] == settings and not manifest.get("posters", True) and os.path.exists(pdf_path) and os.path.exists(solution_pdf_path)
+    posters = False
+    if not usable:
+        build_books(input_path, pdf_path, solution_pdf_path, jobs, seed, options, solutions_per_page, stats_path, auto_size)
+        posters = has_poster_pages(solution_pdf_path, solutions_per_page)
+    elif manifest["puzzles"] == puzzle_hashes and manifest["solution_pages"] == solution_pages:
+        if options.debug:
+            print("Books are up to date")
+    else:
+        old_puzzle_pages = {page_hash: index for index, page_hash in enumerate(manifest["puzzles"])}
+        old_solution_pages = {tuple(page): index for index, page in enumerate(manifest["solution_pages"])}
+        new_puzzle_pages = [index for index, page_hash in enumerate(puzzle_hashes) if page_hash not in old_puzzle_pages]
+        new_solution_pages = [index for index, page in enumerate(solution_pages) if tuple(page) not in old_solution_pages]
+
+        needed = set(new_puzzle_pages)
+        for page_index in new_solution_pages:
+            needed.update(range(page_index * solutions_per_page, min((page_index + 1) * solutions_per_page, len(specs))))
+        needed = sorted(needed)
+
+        if options.debug:
+            print(f'Seed: {seed}')
+            print(f'Regenerating {len(needed)} of {len(specs)} puzzles, {len(new_puzzle_pages)} puzzle and {len(new_solution_pages)} solution pages')
+
+        stats = RunStats() if stats_path else None
+        if stats is not None:
+            options = options._replace(instrumented=True)
+
+        generators = {}
+        for index, (spec, generator) in zip(needed, iter_generated_puzzles([specs[index] for index in needed], jobs, seed, options)):
+            warn_ambiguous(spec, generator)
+            generators[index] = generator
+            if stats is not None:
+                stats.add(spec.title, generator)
+
+        # a new poster solution page would shift the solution groups off their pages
+        if solutions_per_page > 1 and any(generator.needs_poster() for generator in generators.values()):
+            if options.debug:
+                print("Poster solution pages, rebuilding the books in full")
+            build_books(input_path, pdf_path, solution_pdf_path, jobs, seed, options, solutions_per_page, stats_path, auto_size)
+            posters = True
+        else:
+            # render the new pages into in-memory books, in book order
+            puzzle_buffer = io.BytesIO()
+            c = canvas.Canvas(puzzle_buffer, LETTER, invariant=1)
+            for index in new_puzzle_pages:
+                generators[index].generate_pdf(specs[index].title, list(specs[index].words), pdf_path, c)
+                c.showPage()
+            c.save()
+
+            solution_buffer = io.BytesIO()
+            solution_canvas = canvas.Canvas(solution_buffer, LETTER, invariant=1)
+            compositor = SolutionCompositor(solution_canvas, solution_pdf_path, solutions_per_page)
+            for page_index in new_solution_pages:
+                for index in range(page_index * solutions_per_page, min((page_index + 1) * solutions_per_page, len(specs))):
+                    compositor.add(generators[index], specs[index].title)
+                compositor.finish()
+            solution_canvas.save()
+
+            # splice the new pages between the unchanged pages of the old books
+            with open(pdf_path, "rb") as pdf_file:
+                old_puzzles = PdfReader(io.BytesIO(pdf_file.read()))
+            with open(solution_pdf_path, "rb") as pdf_file:
+                old_solutions = PdfReader(io.BytesIO(pdf_file.read()))
+            new_puzzles = iter(PdfReader(puzzle_buffer).pages) if new_puzzle_pages else iter(())
+            new_solutions = iter(PdfReader(solution_buffer).pages) if new_solution_pages else iter(())
+
+            writer = PdfWriter()
+            for page_hash in puzzle_hashes:
+                if page_hash in old_puzzle_pages:
+                    writer.add_page(old_puzzles.pages[old_puzzle_pages[page_hash]])
+                else:
+                    writer.add_page(next(new_puzzles))
+            replace_pdf(writer, pdf_path)
+
+            writer = PdfWriter()
+            for page in solution_pages:
+                if tuple(page) in old_solution_pages:
+                    writer.add_page(old_solutions.pages[old_solution_pages[tuple(page)]])
+                else:
+                    writer.add_page(next(new_solutions))
+            replace_pdf(writer, solution_pdf_path)
+
+            if stats is not None:
+                stats.write(stats_path)
+            if options.cache is not None:
+                options.cache.evict()
+
+    with open(manifest_path, "w") as manifest_file:
+        json.dump({"seed": seed, "settings": settings, "puzzles": puzzle_hashes, "solution_pages": solution_pages, "posters": posters}, manifest_file, indent=2)
+
+    return len(specs)
+
+
+# service defaults
+SERVICE_QUEUE_SIZE = 32 # requests waiting for a worker before new ones are turned away with 503
+SERVICE_TIME_BUDGET = 10 # max seconds the solver spends per requested puzzle, on top of the node budget
+SERVICE_LATENCY_WINDOW = 1000 # latest requests the latency percentiles are taken over
+SERVICE_MAX_BODY = 1024 * 1024 # largest request body accepted
+SERVICE_MAX_GRID = 150 # largest rows (or cols) a request may ask for
+
+
+# function: value at percentile q (0-100) of a list with linear interpolation
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# function: puzzle spec and seed of a POST /puzzle request body
+    # {"title": "...", "words": [...], "rows": 15, "cols": 25, "font_size": "M", "title_size": "L", "seed": 1}
+    # only words is required, rows/cols may be "auto"; a field of the wrong type raises ValueError
+def parse_puzzle_request(body):
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("Body is not valid JSON")
+    if not isinstance(request, dict):
+        raise ValueError("Body must be a JSON object")
+    words = request.get("words")
+    if not isinstance(words, list) or not words or not all(isinstance(word, str) and word.strip() for word in words):
+        raise ValueError("words must be a non-empty list of words")
+
+    for name in ("title", "font_size", "title_size"):
+        if name in request and not isinstance(request[name], str):
+            raise ValueError(f"{name} must be a string")
+    sizes = []
+    for name, default in (("rows", DEFAULT_ROWS), ("cols", DEFAULT_COLS)):
+        size = request.get(name, default)
+        if isinstance(size, str) and size.strip().lower() == "auto":
+            size = None
+        elif isinstance(size, bool) or not isinstance(size, int) or not 1 <= size <= SERVICE_MAX_GRID:
+            raise ValueError(f"{name} must be \"auto\" or a whole number from 1 to {SERVICE_MAX_GRID}")
+        sizes.append(size)
+    seed = request.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+        raise ValueError("seed must be a whole number")
+
+    spec = PuzzleSpec(
+        request.get("title", "Word Search"),
+        sizes[0],
+        sizes[1],
+        request.get("font_size", DEFAULT_FONT_SIZE),
+        request.get("title_size", DEFAULT_TITLE_SIZE),
+        tuple(word.strip() for word in words)
+    )
+    return spec, derive_seed(seed, spec)
+
+
+# function: response body of a finished puzzle, as (bytes, content type)
+    # output: "json" (the Puzzle, see puzzle_to_dict) or "pdf" (puzzle page, then its solution page when solution is set)
+def render_puzzle_response(spec, generator, output, solution):
+    if output == "json":
+        return json.dumps(puzzle_to_dict(puzzle_from_generator(spec, generator))).encode("utf-8"), "application/json"
+
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, LETTER, invariant=1)
+    generator.generate_pdf(spec.title, list(spec.words), None, c)
+    c.showPage()
+    if solution:
+        SolutionCompositor(c, None, 1).add(generator, spec.title)
     c.save()
-    solution_canvas.save()
+    return buffer.getvalue(), "application/pdf"
+
+
+# function: read one HTTP/1.1 request, returns (method, path, query, body)
+async def read_http_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise ConnectionError("Empty request")
+    method, target, _ = request_line.split(" ", 2)
+    path, _, query = target.partition("?")
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    if length > SERVICE_MAX_BODY:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, query, body
+
+
+# function: write an HTTP/1.1 response, streaming the body in chunks
+async def write_http_response(writer, status, content_type, body, extra_headers=()):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 422: "Unprocessable Entity", 500: "Internal Server Error", 503: "Service Unavailable"}
+    head = [f"HTTP/1.1 {status} {reasons[status]}", f"Content-Type: {content_type}", f"Content-Length: {len(body)}", "Connection: close"]
+    head.extend(extra_headers)
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    for start in range(0, len(body), 64 * 1024):
+        writer.write(body[start:start + 64 * 1024])
+        await writer.drain()
+    await writer.drain()
+    writer.close()
+
+
+# function: JSON error response body
+def error_body(message):
+    return json.dumps({"error": message}).encode("utf-8")
+
+
+# class: local asyncio HTTP service that generates single puzzles on demand
+    # POST /puzzle?format=json|pdf[&solution=1]  body: see parse_puzzle_request
+    # GET /stats   queue depth, request counts and latency percentiles (ms)
+    # Requests wait in a bounded queue served by one dispatcher task per worker: placement runs
+    # in the process pool, drawing in one render thread of this process, where the fonts and
+    # page layouts stay warm between requests. When the queue is full a request is answered
+    # with 503 right away, so load beyond capacity is pushed back to the client.
+    # Try it with: curl -d '{"words": ["CAT", "DOG"]}' 'http://127.0.0.1:8080/puzzle?format=pdf' -o puzzle.pdf
+class PuzzleService:
+    def __init__(self, jobs=1, queue_size=SERVICE_QUEUE_SIZE, options=GenerationOptions(time_budget=SERVICE_TIME_BUDGET)):
+        if queue_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        self.jobs = max(1, jobs)
+        self.queue_size = queue_size
+        self.options = options
+        self.latencies = deque(maxlen=SERVICE_LATENCY_WINDOW)
+        self.served = 0
+        self.rejected = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    # function: start the pool, the dispatchers and the server (TCP, or a Unix socket when socket_path is set)
+    async def start(self, host="127.0.0.1", port=8080, socket_path=None):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+        self.renderer = ThreadPoolExecutor(max_workers=1)
+        self.queue = asyncio.Queue(self.queue_size)
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.jobs)]
+        if socket_path:
+            return await asyncio.start_unix_server(self._handle, path=socket_path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    # function: stop the dispatchers and the pools
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.executor.shutdown(cancel_futures=True)
+        self.renderer.shutdown()
+
+    # function: dispatcher task: generate and render queued requests one at a time
+        # a worker process that dies (killed, out of memory) breaks the whole pool: the requests
+        # it held fail and the first dispatcher to notice starts a new pool for the next ones
+    async def _dispatch(self):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        loop = asyncio.get_running_loop()
+        while True:
+            spec, seed, output, solution, result = await self.queue.get()
+            self.in_flight += 1
+            executor = self.executor
+            try:
+                generator = await loop.run_in_executor(executor, generate_puzzle_job, spec, seed, self.options)
+                result.set_result(await loop.run_in_executor(self.renderer, render_puzzle_response, spec, generator, output, solution))
+            except BrokenProcessPool:
+                if self.executor is executor:
+                    executor.shutdown(wait=False)
+                    self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+                result.set_exception(RuntimeError("Worker process died, retry the request"))
+            except Exception as error:
+                result.set_exception(error)
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    # function: queue depth, counters and latency percentiles
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "workers": self.jobs,
+            "served": self.served,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency_ms": {f"p{q}": percentile(latencies, q) * 1000 for q in (50, 90, 99)}
+        }
+
+    # function: answer one connection
+    async def _handle(self, reader, writer):
+        import asyncio
+        start = time.perf_counter()
+        try:
+            method, path, query, body = await read_http_request(reader)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as error:
+            await write_http_response(writer, 400, "application/json", error_body(str(error)))
+            return
+
+        if method == "GET" and path == "/stats":
+            await write_http_response(writer, 200, "application/json", json.dumps(self.stats()).encode("utf-8"))
+            return
+        if method != "POST" or path != "/puzzle":
+            await write_http_response(writer, 404, "application/json", error_body(f"No route for {method} {path}"))
+            return
+
+        parameters = dict(parameter.partition("=")[::2] for parameter in query.split("&") if parameter)
+        output = parameters.get("format", "json")
+        solution = parameters.get("solution", "0") not in ("0", "false", "")
+        try:
+            if output not in ("json", "pdf"):
+                raise ValueError("format must be json or pdf")
+            spec, seed = parse_puzzle_request(body)
+        except ValueError as error:
+            await write_http_response(writer, 400, "application/json", error_body(str(error)))
+            return
+
+        result = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((spec, seed, output, solution, result))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            await write_http_response(writer, 503, "application/json", error_body("Queue is full, retry later"), ["Retry-After: 1"])
+            return
+
+        try:
+            payload, content_type = await result
+        except ValueError as error:
+            self.failed += 1
+            await write_http_response(writer, 422, "application/json", error_body(str(error)))
+            return
+        except Exception as error:
+            self.failed += 1
+            await write_http_response(writer, 500, "application/json", error_body(str(error)))
+            return
+
+        self.served += 1
+        self.latencies.append(time.perf_counter() - start)
+        await write_http_response(writer, 200, content_type, payload)
+
+
+# function: run the puzzle service until interrupted
+async def run_service(host, port, socket_path, jobs, queue_size, options):
+    service = PuzzleService(jobs, queue_size, options)
+    server = await service.start(host, port, socket_path)
+    print(f"Serving puzzles on {socket_path or f'http://{host}:{port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+OUTPUT_FORMATS = ["pdf", "jsonl", "archive", "text"]
+
+
+# function: input files of the command line, glob patterns expanded (sorted) and duplicates dropped
+def expand_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No input file matches {pattern}")
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+# function: indexes of a comma separated list of indexes and inclusive ranges: "0,4,10-19"
+def parse_indexes(value):
+    indexes = []
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        indexes.extend(range(int(first), int(last or first) + 1))
+    return indexes
+
+
+# function: name the outputs of an input file start with
+    # an archive written by a run is named <stem>_puzzles.wfa, so drawing it gives back <stem>'s names
+def output_stem(input_path):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if input_path.endswith(ARCHIVE_SUFFIX) and stem.endswith("_puzzles"):
+        stem = stem[:-len("_puzzles")]
+    return stem
+
+
+# function: (puzzle pdf, solution pdf, jsonl, archive, text) paths of the books of an input file, None for formats not written
+def output_paths(input_path, output_dir, formats):
+    stem = output_stem(input_path)
+    return (
+        os.path.join(output_dir, f"{stem}_puzzles.pdf") if "pdf" in formats else None,
+        os.path.join(output_dir, f"{stem}_solution.pdf") if "pdf" in formats else None,
+        os.path.join(output_dir, f"{stem}_puzzles.jsonl") if "jsonl" in formats else None,
+        os.path.join(output_dir, f"{stem}_puzzles{ARCHIVE_SUFFIX}") if "archive" in formats else None,
+        os.path.join(output_dir, f"{stem}_puzzles.txt") if "text" in formats else None
+    )
+
+
+# function: build the books of one input file, returns (input path, puzzles, seconds, error or None)
+    # runs in a worker process when several files are built at once; a failing file does not stop the others
+    # packed archives (ARCHIVE_SUFFIX) are drawn as they are, see render_archive
+def build_input_file(input_path, paths, incremental, arguments):
+    start = time.perf_counter()
+    try:
+        if input_path.endswith(ARCHIVE_SUFFIX):
+            puzzles = render_archive(input_path, paths[0], paths[1], json_path=paths[2], text_path=paths[4], **arguments)
+        elif incremental:
+            puzzles = rebuild_books(input_path, paths[0], paths[1], **arguments)
+        else:
+            puzzles = build_books(input_path, paths[0], paths[1], json_path=paths[2], archive_path=paths[3], text_path=paths[4], **arguments)
+    except Exception as error:
+        return input_path, 0, time.perf_counter() - start, f"{type(error).__name__}: {error}"
+    return input_path, puzzles, time.perf_counter() - start, None
+
+
+# function: print the per file results of a batch run
+def print_summary(results, wall_time):
+    width = max([len("Input")] + [len(input_path) for input_path, _, _, _ in results])
+    print(f'{"Input":<{width}}  {"Puzzles":>7}  {"Seconds":>8}  Status')
+    for input_path, puzzles, seconds, error in results:
+        print(f'{input_path:<{width}}  {puzzles:>7}  {seconds:>8.2f}  {error or "ok"}')
+    print(f'{len(results)} files, {sum(puzzles for _, puzzles, _, _ in results)} puzzles in {wall_time:.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate word find puzzle and solution books")
+    parser.add_argument("inputs", nargs="*", help=f"input files or glob patterns, {ARCHIVE_SUFFIX} archives are drawn without generating")
+    parser.add_argument("--output-dir", default=".", help="directory the books are written to (default: the current directory)")
+    parser.add_argument("--formats", default="pdf", help=f"comma separated output formats: {', '.join(OUTPUT_FORMATS)}")
+    parser.add_argument("--parallel-files", type=int, default=1, help="input files built at the same time, each with its own --jobs workers")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes placing puzzles")
+    parser.add_argument("--seed", type=int, default=None, help="run seed, the same seed gives byte-identical output")
+    parser.add_argument("--solutions-per-page", type=int, default=2, choices=sorted(NUP_ARRANGEMENTS), help="solution grids per solution page")
+    parser.add_argument("--debug", action="store_true", help="print debug information while generating")
+    parser.add_argument("--stats", default=None, help="write per puzzle counters and timings to this .json or .csv file (one per input, suffixed with its name)")
+    parser.add_argument("--verify", action="store_true", help="warn about listed words not found exactly once in their grid")
+    parser.add_argument("--solver", default=DEFAULT_SOLVER, choices=["backtracking", "constraint"], help="word placement solver")
+    parser.add_argument("--fill", default=DEFAULT_FILL, choices=["random", "unique"], help="how empty cells are filled")
+    parser.add_argument("--overlap", type=float, default=DEFAULT_OVERLAP, help="probability (0-1) of trying crossing placements first")
+    parser.add_argument("--auto-size", action="store_true", help="find the smallest grid for puzzles without Rows:/Cols:")
+    parser.add_argument("--aspect", type=float, default=DEFAULT_ASPECT, help="cols per row of automatically sized grids")
+    parser.add_argument("--restart-unit", type=int, default=DEFAULT_RESTART_UNIT, help="placements before the first solver restart (0 for no restarts)")
+    parser.add_argument("--portfolio", type=int, default=DEFAULT_PORTFOLIO, help="independently seeded attempts raced per puzzle across the jobs")
+    parser.add_argument("--cache", default=None, help="directory of finished puzzles reused by later runs")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help="megabytes kept in the cache directory")
+    parser.add_argument("--incremental", action="store_true", help="only re-render the pages of puzzles changed since the last --incremental build")
+    parser.add_argument("--shard-size", type=int, default=None, help="write the books as numbered files of this many puzzles each")
+    parser.add_argument("--merge-shards", action="store_true", help="join the shard files into the two books at the end")
+    parser.add_argument("--pipeline", action="store_true", help="draw both books in renderer processes while puzzles are generated")
+    parser.add_argument("--serve", action="store_true", help="run the on-demand puzzle HTTP service instead of building books")
+    parser.add_argument("--host", default="127.0.0.1", help="service address")
+    parser.add_argument("--port", type=int, default=8080, help="service port")
+    parser.add_argument("--socket", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="requests the service queues before answering 503")
+    parser.add_argument("--time-budget", type=float, default=None, help=f"max seconds the service spends placing one puzzle, 0 for no limit (default: {SERVICE_TIME_BUDGET}); books stop on the node budget only")
+    parser.add_argument("--indexes", default=None, help=f"puzzles of {ARCHIVE_SUFFIX} inputs to draw, e.g. 0,4,10-19 (default: all)")
+    args = parser.parse_args()
+
+    formats = [output_format.strip() for output_format in args.formats.split(",") if output_format.strip()]
+    if not formats or any(output_format not in OUTPUT_FORMATS for output_format in formats):
+        parser.error(f"--formats must be a comma separated list of {', '.join(OUTPUT_FORMATS)}")
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error("--shard-size must be at least 1")
+    if args.incremental and args.shard_size is not None:
+        parser.error("--incremental cannot be combined with --shard-size")
+    if args.incremental and formats != ["pdf"]:
+        parser.error("--incremental only builds pdf books")
+    try:
+        indexes = parse_indexes(args.indexes) if args.indexes else None
+    except ValueError:
+        parser.error("--indexes must be a comma separated list of indexes and ranges like 10-19")
+
+    cache = PuzzleCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+    options = GenerationOptions(solver=args.solver, fill=args.fill, overlap=args.overlap, aspect=args.aspect, restart_unit=args.restart_unit or None,
+                                portfolio=args.portfolio, cache=cache, verify=args.verify, debug=args.debug)
+    if args.time_budget is not None and not args.serve:
+        parser.error("--time-budget only applies to --serve, books stop on the node budget so a seed always gives the same puzzles")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    if args.serve:
+        time_budget = SERVICE_TIME_BUDGET if args.time_budget is None else args.time_budget or None
+        options = options._replace(time_budget=time_budget)
+        import asyncio
+        try:
+            asyncio.run(run_service(args.host, args.port, args.socket, args.jobs, args.queue_size, options))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if not args.inputs:
+        parser.error("at least one input file is required")
+    try:
+        input_paths = expand_inputs(args.inputs)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+    stems = [output_stem(input_path) for input_path in input_paths]
+    if len(set(stems)) != len(stems):
+        parser.error("input files must have different names, their books share the output directory")
+    archives = [input_path.endswith(ARCHIVE_SUFFIX) for input_path in input_paths]
+    if any(archives) and (args.incremental or "archive" in formats):
+        parser.error(f"{ARCHIVE_SUFFIX} inputs are only drawn, not rebuilt or archived again")
+    if indexes is not None and not any(archives):
+        parser.error(f"--indexes only applies to {ARCHIVE_SUFFIX} inputs")
+
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    jobs = []
+    for input_path, stem, is_archive in zip(input_paths, stems, archives):
+        if is_archive:
+            arguments = dict(indexes=indexes, solutions_per_page=args.solutions_per_page, shard_size=args.shard_size, merge_shards=args.merge_shards)
+            jobs.append((input_path, output_paths(input_path, output_dir, formats), False, arguments))
+            continue
+
+        stats_path = args.stats
+        if stats_path and len(input_paths) > 1:
+            root, extension = os.path.splitext(stats_path)
+            stats_path = f"{root}-{stem}{extension}"
+        arguments = dict(jobs=args.jobs, seed=args.seed, options=options, solutions_per_page=args.solutions_per_page, stats_path=stats_path, auto_size=args.auto_size)
+        if not args.incremental:
+            arguments.update(shard_size=args.shard_size, merge_shards=args.merge_shards, pipeline=args.pipeline)
+        jobs.append((input_path, output_paths(input_path, output_dir, formats), args.incremental, arguments))
+
+    start = time.perf_counter()
+    if args.parallel_files > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.parallel_files) as executor:
+            results = list(executor.map(build_input_file, *zip(*jobs)))
+    else:
+        results = [build_input_file(*job) for job in jobs]
+
+    if len(results) > 1 or results[0][3]:
+        print_summary(results, time.perf_counter() - start)
+    if any(error for _, _, _, error in results):
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+
+# the generator script, loaded by path because its file name is not a module name
+WORDFIND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wordfind_1.0.py")
+
+# benchmark matrix: grid sizes, word length shapes (min, max) and fill densities
+# (share of the grid covered by word letters, which sets the word count)
+GRID_SIZES = [10, 20, 40, 70, 100]
+WORD_SHAPES = {"short": (3, 5), "medium": (6, 9), "long": (10, 14)}
+DENSITIES = [0.2, 0.4]
+QUICK_GRID_SIZES = [10, 20, 40]
+QUICK_DENSITIES = [0.3]
+
+# seeds used for the repeats of every case, fixed so runs are comparable
+SEEDS = [11, 23, 37, 41, 53, 67, 79, 83, 97, 101]
+
+
+# function: load wordfind_1.0.py as the module "wordfind"
+def load_wordfind(path=WORDFIND_PATH):
+    spec = importlib.util.spec_from_file_location("wordfind", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["wordfind"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# function: random words for a case, drawn from the case seed
+def make_word_list(size, shape, density, seed):
+    word_random = random.Random(seed)
+    min_length, max_length = WORD_SHAPES[shape]
+    max_length = min(max_length, size)
+    min_length = min(min_length, max_length)
+
+    words = []
+    letters = 0
+    while letters < density * size * size:
+        length = word_random.randint(min_length, max_length)
+        words.append("".join(word_random.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(length)))
+        letters += length
+    return words
+
+
+# function: value at percentile q (0-100) with linear interpolation
+def percentile(values, q):
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+# function: generate and render one small puzzle, untimed, before the first case
+    # the first puzzle of a process pays for importing numpy and registering the fonts,
+    # which would otherwise be charged to the first case of the matrix
+def warm_up(wordfind, solver, node_budget, overlap):
+    words = make_word_list(QUICK_GRID_SIZES[0], "short", QUICK_DENSITIES[0], SEEDS[0])
+    generator = wordfind.WordFindPuzzleGenerator(QUICK_GRID_SIZES[0], QUICK_GRID_SIZES[0], words, 'M', 'L', debug=False, seed=SEEDS[0])
+    generator.set_font_size('M', 'L')
+    generator.generate_puzzle(words, solver, node_budget, None, "random", overlap)
+    generator.generate_pdf("Benchmark", words, None, canvas.Canvas(io.BytesIO(), letter, invariant=1))
+    generator.generate_solution_pdf("Benchmark", None, canvas.Canvas(io.BytesIO(), letter, invariant=1), (2, 0))
+
+
+# function: run one benchmark case over every seed and collect timings and memory peaks
+    # cases stop on node_budget, so every run does the same work whatever the machine load;
+    # time_budget (None: no limit) is an extra wall clock cap
+def run_case(wordfind, size, shape, density, repeat, solver, node_budget, time_budget, overlap):
+    placement_times = []
+    render_times = []
+    solution_times = []
+    placed_ratios = []
+    memory_peaks = []
+
+    for seed in SEEDS[:repeat]:
+        words = make_word_list(size, shape, density, seed)
+
+        # timed pass
+        generator = wordfind.WordFindPuzzleGenerator(size, size, words, 'M', 'L', debug=False, seed=seed)
+        generator.set_font_size('M', 'L')
+        start = time.perf_counter()
+        generator.generate_puzzle(words, solver, node_budget, time_budget, "random", overlap)
+        placement_times.append(time.perf_counter() - start)
+        placed_ratios.append(len(generator.placed_words) / len(words))
+
+        pdf = canvas.Canvas(io.BytesIO(), letter, invariant=1)
+        start = time.perf_counter()
+        generator.generate_pdf("Benchmark", words, None, pdf)
+        render_times.append(time.perf_counter() - start)
+
+        solution = canvas.Canvas(io.BytesIO(), letter, invariant=1)
+        start = time.perf_counter()
+        generator.generate_solution_pdf("Benchmark", None, solution, (2, 0))
+        solution_times.append(time.perf_counter() - start)
+
+        # memory pass, kept apart because tracemalloc slows everything down
+        generator = wordfind.WordFindPuzzleGenerator(size, size, words, 'M', 'L', debug=False, seed=seed)
+        generator.set_font_size('M', 'L')
+        tracemalloc.start()
+        generator.generate_puzzle(words, solver, node_budget, time_budget, "random", overlap)
+        memory_peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "size": size,
+        "shape": shape,
+        "density": density,
+        "words": len(make_word_list(size, shape, density, SEEDS[0])),
+        "placed": sum(placed_ratios) / len(placed_ratios),
+        "placement": summarize(placement_times),
+        "render": summarize(render_times),
+        "solution_render": summarize(solution_times),
+        "memory_peak": max(memory_peaks)
+    }
+
+
+# function: percentiles of a list of timings
+def summarize(times):
+    return {"p50": percentile(times, 50), "p90": percentile(times, 90), "p99": percentile(times, 99)}
+
+
+# function: name of a case in reports and baselines
+def case_name(result):
+    return f'{result["size"]}x{result["size"]}/{result["shape"]}/{result["density"]}'
+
+
+# function: compare p50 timings against a stored baseline
+    # a case regresses when it is more than tolerance slower and at least a millisecond slower
+def compare(results, baseline, tolerance):
+    regressions = []
+    for result in results:
+        name = case_name(result)
+        if name not in baseline:
+            continue
+        for metric in ("placement", "render", "solution_render"):
+            current = result[metric]["p50"]
+            previous = baseline[name][metric]["p50"]
+            if current > previous * (1 + tolerance) and current - previous > 0.001:
+                regressions.append(f'{name} {metric}: {previous * 1000:.1f} ms -> {current * 1000:.1f} ms')
+    return regressions
+
+
+# function: print the report header
+def print_header():
+    print(f'{"case":<24}{"words":>6}{"placed":>8}{"place p50":>11}{"p90":>9}{"p99":>9}{"render p50":>12}{"solution p50":>14}{"mem peak":>11}')
+
+
+# function: print the report line of one case
+def print_result(result):
+    print(
+        f'{case_name(result):<24}{result["words"]:>6}{result["placed"]:>8.0%}'
+        f'{result["placement"]["p50"] * 1000:>9.1f}ms{result["placement"]["p90"] * 1000:>7.1f}ms{result["placement"]["p99"] * 1000:>7.1f}ms'
+        f'{result["render"]["p50"] * 1000:>10.1f}ms{result["solution_render"]["p50"] * 1000:>12.1f}ms'
+        f'{result["memory_peak"] / 1024:>9.0f}KB'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark word find placement and rendering")
+    parser.add_argument("--quick", action="store_true", help="small matrix for a fast check")
+    parser.add_argument("--repeat", type=int, default=5, help=f"seeds per case (at most {len(SEEDS)})")
+    parser.add_argument("--solver", default="backtracking", choices=["backtracking", "constraint"])
+    parser.add_argument("--node-budget", type=int, default=None, help="max placements tried per puzzle (default: the generator's DEFAULT_NODE_BUDGET)")
+    parser.add_argument("--time-budget", type=float, default=None, help="max placement seconds per puzzle on top of the node budget (default: no limit)")
+    parser.add_argument("--overlap", type=float, default=0.0, help="probability (0-1) of trying crossing placements first")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, help="write the results as a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a case counts as a regression")
+    args = parser.parse_args()
+
+    wordfind = load_wordfind()
+    sizes = QUICK_GRID_SIZES if args.quick else GRID_SIZES
+    densities = QUICK_DENSITIES if args.quick else DENSITIES
+    repeat = max(1, min(args.repeat, len(SEEDS)))
+    node_budget = wordfind.DEFAULT_NODE_BUDGET if args.node_budget is None else args.node_budget
+
+    warm_up(wordfind, args.solver, node_budget, args.overlap)
+    print_header()
+    results = []
+    for size in sizes:
+        for shape in WORD_SHAPES:
+            for density in densities:
+                results.append(run_case(wordfind, size, shape, density, repeat, args.solver, node_budget, args.time_budget, args.overlap))
+                print_result(results[-1])
+                sys.stdout.flush()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({case_name(result): result for result in results}, baseline_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()